@@ -1,13 +1,16 @@
 import streamlit as st
-import yfinance as yf
 import pandas as pd
 import numpy as np
 import plotly.graph_objects as go
-import requests
-from bs4 import BeautifulSoup
 from datetime import datetime, timedelta
 import time
-import re
+import os
+import threading
+from functools import wraps
+from valuation import dcf, metrics, montecarlo, projection, screener, warmer
+from valuation.ratios import ROLLING_WINDOW
+from valuation.service import get_full_analysis, get_market_data, get_ratio_history, get_weiss_data
+from valuation.upstream import UpstreamError, scheduler
 
 # --- CONFIGURACIÓN DE PÁGINA ---
 st.set_page_config(page_title="Valuación Master Pro", layout="wide", page_icon="💎")
@@ -59,179 +62,68 @@ st.markdown("""
     .scenario-bear { background: linear-gradient(135deg, #d63031 0%, #e84393 100%); }
     .scenario-title { font-size: 24px; font-weight: 800; margin-bottom: 5px; }
     .scenario-price { font-size: 38px; font-weight: 900; margin: 5px 0; }
+
+    /* SENSIBILIDAD: el marcador es un gráfico transparente superpuesto al mapa de calor (misma altura) */
+    .st-key-sensitivity-marker { margin-top: calc(-500px - 1rem); }
+    .st-key-sensitivity-marker, .st-key-sensitivity-marker * { pointer-events: none !important; }
     </style>
 """, unsafe_allow_html=True)
 
 # --- 1. FUNCIONES DE DATOS (VERSIÓN ROBUSTA PARA EVITAR N/A) ---
 
-@st.cache_data(ttl=3600)
-def get_finviz_growth(ticker):
-    url = f"https://finviz.com/quote.ashx?t={ticker}"
-    headers = {'User-Agent': 'Mozilla/5.0'}
-    try:
-        r = requests.get(url, headers=headers, timeout=5)
-        if r.status_code == 200:
-            soup = BeautifulSoup(r.content, 'html.parser')
-            t = soup.find(string="EPS next 5Y")
-            if t:
-                val = t.parent.find_next_sibling('td').text.replace('%', '').strip()
-                if val != '-': return float(val)
-    except: pass
-    return None
-
-@st.cache_data(ttl=3600)
-def get_stockanalysis_growth(ticker):
-    try:
-        url = f"https://stockanalysis.com/stocks/{ticker.lower()}/forecast/"
-        headers = {'User-Agent': 'Mozilla/5.0'}
-        r = requests.get(url, headers=headers, timeout=5)
-        if r.status_code == 200:
-            matches = re.findall(r'(\d+\.?\d*)%\s*(?:annual|avg|average|growth)', r.text, re.IGNORECASE)
-            if matches: return float(matches[0])
-    except: pass
-    return None
-
-@st.cache_data(ttl=3600)
-def calculate_robust_ratios(ticker, years=10):
+def instrumented_cache(**cache_kwargs):
     """
-    Cálculo ROBUSTO de ratios históricos.
-    Devuelve diccionario con {median, min, max} para cada ratio.
-    Usa fallback: Trimestral -> Anual.
+    st.cache_data con métricas por función: el cuerpo solo se ejecuta en un fallo, así que
+    lo que no llega al cuerpo es un acierto; un fallo de una clave ya calculada cuenta
+    como expiración (TTL o desalojo por max_entries).
     """
-    ratios = {}
-    try:
-        stock = yf.Ticker(ticker)
-        hist = stock.history(period=f"{years}y", interval="1mo")
-        if hist.empty: return {}
-        if hist.index.tz is not None: hist.index = hist.index.tz_localize(None)
-        hist = hist[['Close']]
-
-        # Datos Financieros
-        q_fin = stock.quarterly_financials.T
-        a_fin = stock.financials.T
-        
-        def get_col(df, candidates):
-            for c in candidates:
-                if c in df.columns: return df[c]
-            return None
-
-        # --- PER (EPS) ---
-        eps_series = None
-        use_quarterly = False
-        
-        # Intento Trimestral (Rolling TTM)
-        if not q_fin.empty:
-            eps_q = get_col(q_fin, ['Diluted EPS', 'Basic EPS', 'Net Income'])
-            if eps_q is not None:
-                q_fin.index = pd.to_datetime(q_fin.index).tz_localize(None)
-                q_fin = q_fin.sort_index()
-                if 'Diluted EPS' in q_fin.columns:
-                    eps_ttm = q_fin['Diluted EPS'].rolling(4).sum()
-                    if eps_ttm is not None and not eps_ttm.dropna().empty:
-                        eps_series = eps_ttm
-                        use_quarterly = True
-        
-        # Fallback Anual
-        if eps_series is None and not a_fin.empty:
-            a_fin.index = pd.to_datetime(a_fin.index).tz_localize(None)
-            a_fin = a_fin.sort_index()
-            eps_series = get_col(a_fin, ['Diluted EPS', 'Basic EPS'])
-
-        if eps_series is not None:
-            df_pe = pd.DataFrame(index=hist.index)
-            df_pe['Price'] = hist['Close']
-            df_pe['EPS'] = eps_series.reindex(hist.index, method='ffill')
-            df_pe['PE'] = df_pe['Price'] / df_pe['EPS']
-            valid_pe = df_pe['PE'][(df_pe['PE'] > 0) & (df_pe['PE'] < 200)].dropna()
-            
-            if not valid_pe.empty:
-                ratios['PER'] = {
-                    'median': float(valid_pe.median()),
-                    'min': float(valid_pe.quantile(0.05)),
-                    'max': float(valid_pe.quantile(0.95))
-                }
-
-        # --- Price/Sales ---
-        fin_df = q_fin if use_quarterly else a_fin
-        if not fin_df.empty:
-            rev = get_col(fin_df, ['Total Revenue', 'Total Income'])
-            shares = get_col(fin_df, ['Basic Average Shares', 'Ordinary Shares Number', 'Share Issued'])
-            
-            if rev is not None and shares is not None:
-                if use_quarterly: rev = rev.rolling(4).sum()
-                rps = rev / shares
-                df_ps = pd.DataFrame(index=hist.index)
-                df_ps['Price'] = hist['Close']
-                df_ps['RPS'] = rps.reindex(hist.index, method='ffill')
-                df_ps['PS'] = df_ps['Price'] / df_ps['RPS']
-                valid_ps = df_ps['PS'][(df_ps['PS'] > 0) & (df_ps['PS'] < 50)].dropna()
-                
-                if not valid_ps.empty:
-                    ratios['Price/Sales'] = {
-                        'median': float(valid_ps.median()),
-                        'min': float(valid_ps.quantile(0.05)),
-                        'max': float(valid_ps.quantile(0.95))
-                    }
-        
-        # --- Price/Book ---
-        q_bs = stock.quarterly_balance_sheet.T
-        a_bs = stock.balance_sheet.T
-        bs_df = q_bs if not q_bs.empty else a_bs
-        
-        if not bs_df.empty:
-            bs_df.index = pd.to_datetime(bs_df.index).tz_localize(None)
-            bs_df = bs_df.sort_index()
-            assets = get_col(bs_df, ['Total Assets'])
-            liabs = get_col(bs_df, ['Total Liabilities Net Minority Interest', 'Total Liabilities'])
-            shares_bs = get_col(fin_df, ['Basic Average Shares', 'Ordinary Shares Number']) # Shares from Income St usually
-            
-            if assets is not None and liabs is not None and shares_bs is not None:
-                bvps = (assets - liabs) / shares_bs
-                df_pb = pd.DataFrame(index=hist.index)
-                df_pb['Price'] = hist['Close']
-                df_pb['BVPS'] = bvps.reindex(hist.index, method='ffill')
-                df_pb['PB'] = df_pb['Price'] / df_pb['BVPS']
-                valid_pb = df_pb['PB'][(df_pb['PB'] > 0) & (df_pb['PB'] < 50)].dropna()
-                
-                if not valid_pb.empty:
-                    ratios['Price/Book'] = {
-                        'median': float(valid_pb.median()),
-                        'min': float(valid_pb.quantile(0.05)),
-                        'max': float(valid_pb.quantile(0.95))
-                    }
-        return ratios
-
-    except Exception: return {}
-
-@st.cache_data(ttl=3600)
-def get_full_analysis(ticker, years_hist=10):
-    try:
-        stock = yf.Ticker(ticker)
-        info = stock.info
-        price = info.get('currentPrice') or info.get('regularMarketPrice')
-        if not price: return None
-        
-        hist_ratios = calculate_robust_ratios(ticker, years_hist)
-        div_rate = info.get('dividendRate', 0)
-        current_yield = (div_rate / price) if (div_rate and price > 0) else 0
-        
-        # Priorizar PER calculado robustamente, sino usar Yahoo
-        pe_mean = 15.0
-        if 'PER' in hist_ratios: pe_mean = hist_ratios['PER']['median']
-        elif info.get('trailingPE'): pe_mean = float(info.get('trailingPE'))
-        
-        # Historial de dividendos crudo para Weiss
-        div_history = stock.dividends
-        
-        finviz_g = get_finviz_growth(ticker)
-        if finviz_g is None: finviz_g = get_stockanalysis_growth(ticker)
-
-        return {
-            'info': info, 'price': float(price), 'pe_mean': float(pe_mean),
-            'div_data': {'current': float(current_yield), 'rate': float(div_rate), 'history': div_history},
-            'hist_ratios': hist_ratios, 'finviz_growth': finviz_g, 'ticker': ticker
-        }
-    except: return None
+    def deco(fn):
+        name, seen, local = fn.__name__, set(), threading.local()
+
+        @wraps(fn)
+        def body(*args, **kwargs):
+            local.ran = True
+            key = repr((args, sorted(kwargs.items())))
+            metrics.cache_event(name, 'expiry' if key in seen else 'miss')
+            seen.add(key)
+            with metrics.timed(name): return fn(*args, **kwargs)
+
+        cached = st.cache_data(**cache_kwargs)(body)
+
+        @wraps(fn)
+        def wrapper(*args, **kwargs):
+            local.ran = False
+            value = cached(*args, **kwargs)
+            if not local.ran: metrics.cache_event(name, 'hit')
+            return value
+
+        wrapper.clear = cached.clear
+        return wrapper
+    return deco
+
+@st.cache_resource
+def start_metrics_server(port):
+    """/metrics en formato Prometheus para agregar p50/p95 entre réplicas (VALOR_METRICS_PORT)."""
+    return metrics.serve(port)
+
+if os.environ.get("VALOR_METRICS_PORT"): start_metrics_server(int(os.environ["VALOR_METRICS_PORT"]))
+
+@st.cache_resource
+def start_warmer():
+    """Precalentamiento de la watchlist en un hilo de fondo (uno por proceso; VALOR_WARMER=off si corre aparte)."""
+    tickers = warmer.load_watchlist()
+    if not tickers or os.environ.get("VALOR_WARMER", "").lower() == "off": return None
+    return warmer.Warmer(tickers).start()
+
+watchlist_warmer = start_warmer()
+
+@instrumented_cache(ttl=3600, max_entries=16)  # ~640 KB por entrada (dos rejillas 200x200 float64): ~10 MB en total
+def get_sensitivity(ticker, eps, price, pe_ref, n=200):
+    """Rejilla crecimiento x PER (n x n) calculada una vez por ticker/EPS; no depende de los inputs del usuario."""
+    growths = np.linspace(-10, 40, n)
+    pes = np.linspace(5, max(60.0, pe_ref * 2), n)
+    f_price, cagr = projection.sensitivity_grid(eps, price, growths, pes)
+    return growths, pes, f_price, cagr
 
 # --- 2. COMPONENTES VISUALES ---
 
@@ -240,21 +132,14 @@ def show_alert(message, alert_type="info"):
     icon_map = {"danger": "🚨", "warning": "⚠️", "info": "ℹ️", "success": "✅"}
     st.markdown(f"""<div class="alert-box {class_map[alert_type]}"><strong>{icon_map[alert_type]} {message}</strong></div>""", unsafe_allow_html=True)
 
-def validate_projection(growth, exit_pe, cagr, price):
-    warnings = []
-    if growth > 25: warnings.append({"type": "warning", "msg": f"<b>Crecimiento de {growth:.1f}%</b> es muy agresivo."})
-    if exit_pe > 40: warnings.append({"type": "warning", "msg": f"<b>PER de {exit_pe:.1f}x</b> sugiere valoración premium."})
-    if cagr > 25: warnings.append({"type": "warning", "msg": f"<b>CAGR de {cagr:.1f}%</b> es excelente pero ambicioso."})
-    return warnings
-
 def card_html(label, value, sub_value=None, color_class="neu"):
     sub_html = f"<div class='metric-sub {color_class}'>{sub_value}</div>" if sub_value else ""
     st.markdown(f"""<div class='metric-card'><div class='metric-label'>{label}</div><div class='metric-value'>{value}</div>{sub_html}</div>""", unsafe_allow_html=True)
 
 def verdict_box(price, fair_value):
-    margin = ((fair_value - price) / price) * 100
-    if margin > 15: css, title, main, icon, desc = "v-undervalued", "💎 OPORTUNIDAD", "INFRAVALORADA", "🚀", f"Descuento del {margin:.1f}%"
-    elif margin < -15: css, title, main, icon, desc = "v-overvalued", "⚠️ CUIDADO", "SOBREVALORADA", "🛑", f"Prima del {abs(margin):.1f}%"
+    margin = projection.margin(price, fair_value)
+    if margin > projection.VERDICT_MARGIN: css, title, main, icon, desc = "v-undervalued", "💎 OPORTUNIDAD", "INFRAVALORADA", "🚀", f"Descuento del {margin:.1f}%"
+    elif margin < -projection.VERDICT_MARGIN: css, title, main, icon, desc = "v-overvalued", "⚠️ CUIDADO", "SOBREVALORADA", "🛑", f"Prima del {abs(margin):.1f}%"
     else: css, title, main, icon, desc = "v-fair", "⚖️ EQUILIBRIO", "PRECIO JUSTO", "✅", f"Cotizando cerca de su valor"
     st.markdown(f"""<div class="verdict-box {css}"><div class="v-title">{title}</div><div class="v-main">{icon} {main}</div><div class="v-desc">{desc} (Fair: ${fair_value:.2f})</div></div>""", unsafe_allow_html=True)
 
@@ -262,6 +147,78 @@ def scenario_card(title, price_proj, cagr, growth, exit_pe, scenario_type="base"
     css_class = f"scenario-{scenario_type}"
     st.markdown(f"""<div class="scenario-card {css_class}"><div class="scenario-title">{title}</div><div class="scenario-price">${price_proj:,.2f}</div><div class="scenario-cagr">CAGR: {cagr:.1f}%</div><div style="margin-top:15px; font-size:16px; opacity:0.9;">Growth: {growth:.1f}% | Exit PER: {exit_pe:.1f}x</div></div>""", unsafe_allow_html=True)
 
+@metrics.timer("render.fan_chart")
+def fan_chart(sim, price, cagr):
+    """Abanico P5-P95 / P25-P75 del Monte Carlo con la proyección de la calculadora superpuesta."""
+    yrs = list(range(datetime.now().year, datetime.now().year+6))
+    p5, p25, p50, p75, p95 = sim['fan']
+    fig = go.Figure()
+    fig.add_trace(go.Scatter(x=yrs, y=p95, mode='lines', line=dict(width=0), showlegend=False))
+    fig.add_trace(go.Scatter(x=yrs, y=p5, mode='lines', line=dict(width=0), fill='tonexty', fillcolor='rgba(9, 132, 227, 0.15)', name='P5 - P95'))
+    fig.add_trace(go.Scatter(x=yrs, y=p75, mode='lines', line=dict(width=0), showlegend=False))
+    fig.add_trace(go.Scatter(x=yrs, y=p25, mode='lines', line=dict(width=0), fill='tonexty', fillcolor='rgba(9, 132, 227, 0.3)', name='P25 - P75'))
+    fig.add_trace(go.Scatter(x=yrs, y=p50, mode='lines+markers', name='Mediana (P50)', line=dict(color='#0984e3', width=4)))
+    fig.add_trace(go.Scatter(x=yrs, y=[price * ((1 + cagr/100)**i) for i in range(6)], mode='lines', name='Calculadora', line=dict(color='#2d3436', width=2, dash='dash')))
+    fig.update_layout(title="Abanico de Valor Teórico (Monte Carlo)", height=400)
+    st.plotly_chart(fig, use_container_width=True)
+
+# Área de dibujo fija (márgenes sin autoajuste y ejes sin zoom) para que el marcador caiga sobre su celda.
+SENSITIVITY_LAYOUT = dict(height=500, margin=dict(l=70, r=110, t=60, b=60, autoexpand=False))
+
+def _grid_range(values):
+    """Extremos del eje de una rejilla uniforme, media celda por fuera como los dibuja el Heatmap."""
+    half = (values[-1] - values[0]) / (len(values) - 1) / 2
+    return [values[0] - half, values[-1] + half]
+
+@metrics.timer("render.sensitivity_heatmap")
+def sensitivity_heatmap(growths, pes, f_price, cagr):
+    """
+    Mapa de calor del CAGR (hover con precio 2029). No depende de los inputs: al ser idéntico en
+    cada rerun, Streamlit solo reenvía su hash y el navegador reutiliza los ~900 KB ya recibidos.
+    """
+    fig = go.Figure(go.Heatmap(x=pes, y=growths, z=cagr, customdata=f_price, colorscale='RdYlGn', zmid=0,
+                               colorbar=dict(title='CAGR %', x=1.02, xanchor='left', thickness=20),
+                               hovertemplate="PER %{x:.1f}x | Growth %{y:.1f}%<br>Precio: $%{customdata:,.2f}<br>CAGR: %{z:.1f}%<extra></extra>"))
+    fig.update_layout(title="Sensibilidad: Crecimiento × PER de Salida", **SENSITIVITY_LAYOUT,
+                      xaxis=dict(title="PER Salida", range=_grid_range(pes), fixedrange=True),
+                      yaxis=dict(title="Crecimiento (5y) %", range=_grid_range(growths), fixedrange=True))
+    st.plotly_chart(fig, use_container_width=True)
+
+@metrics.timer("render.sensitivity_marker")
+def sensitivity_marker(growths, pes, growth_now, pe_now):
+    """Solo el punto actual (lo único que cambia con los inputs), en un gráfico transparente encima del mapa."""
+    fig = go.Figure(go.Scatter(x=[pe_now], y=[growth_now], mode='markers', name='Actual',
+                               marker=dict(symbol='x', size=16, color='#2d3436', line=dict(width=2, color='white'))))
+    fig.update_layout(**SENSITIVITY_LAYOUT, showlegend=False, paper_bgcolor='rgba(0,0,0,0)', plot_bgcolor='rgba(0,0,0,0)',
+                      xaxis=dict(range=_grid_range(pes), visible=False), yaxis=dict(range=_grid_range(growths), visible=False))
+    with st.container(key="sensitivity-marker"):
+        st.plotly_chart(fig, use_container_width=True, config={'staticPlot': True})
+
+@metrics.timer("render.weiss_chart")
+def weiss_chart(series, years):
+    """Canal Weiss: techo (venta), suelo con zona de compra sombreada y precio."""
+    fig_w = go.Figure()
+    # Techo (Rojo)
+    fig_w.add_trace(go.Scatter(x=series['overvalued'][0], y=series['overvalued'][1], mode='lines', name='Zona Venta', line=dict(color='rgba(231, 76, 60, 0.5)', dash='dot')))
+    # Suelo (Verde) con relleno de la zona de compra hasta el eje
+    fig_w.add_trace(go.Scatter(x=series['undervalued'][0], y=series['undervalued'][1], mode='lines', name='Zona Compra', line=dict(color='rgba(0, 184, 148, 0.5)', dash='dot'), fill='tozeroy', fillcolor='rgba(0, 184, 148, 0.1)'))
+    dates, close = series['close']
+    fig_w.add_trace(go.Scatter(x=dates, y=close, mode='lines', name='Precio', line=dict(color='#2d3436', width=2)))
+    fig_w.update_layout(title=f"Canal de Valoración Geraldine Weiss ({years}Y)", height=500, yaxis_range=[close.min()*0.8, close.max()*1.2])
+    st.plotly_chart(fig_w, use_container_width=True)
+
+@metrics.timer("render.percentile_heatmap")
+def percentile_heatmap(hist, labels):
+    """Percentil histórico de cada ratio mes a mes (verde = barata frente a su historia)."""
+    names = [n for n in labels if (n, 'pct') in hist.columns]
+    pct = np.array([hist[(n, 'pct')].to_numpy() for n in names])
+    custom = np.dstack([np.array([hist[(n, f)].to_numpy() for n in names]) for f in ('value', 'z')])
+    fig = go.Figure(go.Heatmap(x=hist.index, y=[labels[n] for n in names], z=pct, customdata=custom, zmin=0, zmax=100,
+                               colorscale='RdYlGn_r', colorbar=dict(title='Percentil'),
+                               hovertemplate="%{x|%m/%Y} | %{y}<br>Valor: %{customdata[0]:.2f}x<br>Percentil: %{z:.0f}<br>z-score: %{customdata[1]:+.2f}<extra></extra>"))
+    fig.update_layout(title="Percentil frente a su propia historia, mes a mes", height=120 + 60 * len(names))
+    st.plotly_chart(fig, use_container_width=True)
+
 def valuation_meter(label, current, median, min_val, max_val):
     """COMPONENTE VISUAL PARA EL VALUÓMETRO (TAB 3)"""
     if current is None or median is None: return
@@ -295,43 +252,46 @@ def valuation_meter(label, current, median, min_val, max_val):
     </div>
     """, unsafe_allow_html=True)
 
-# --- 3. MAIN APP ---
-
-with st.sidebar:
-    st.header("🎛️ Configuración")
-    ticker = st.text_input("Ticker", value="GOOGL").upper().strip()
-    st.divider()
-    years_hist = st.slider("Años Media Histórica", 5, 10, 10)
-
-if ticker:
-    with st.spinner(f'⚙️ Procesando datos para {ticker}...'):
-        data = get_full_analysis(ticker, years_hist)
-    
-    if not data:
-        st.error("❌ Error: No se encontró el Ticker o faltan datos.")
-        st.stop()
-        
-    info = data['info']
-    price = data['price']
-    pe_mean = data['pe_mean']
-    divs = data['div_data']
-    hist_ratios = data['hist_ratios']
-    finviz_g = data['finviz_growth']
-    
-    default_g = finviz_g if finviz_g else 10.0
-    eps = info.get('trailingEps', 0) or info.get('forwardEps', 1)
-    if eps is None: eps = 1
-    fair_value = float(eps) * pe_mean
-
-    # --- SIDEBAR INPUTS ---
-    with st.sidebar:
-        st.subheader("⚙️ Proyección")
-        growth_input = st.number_input("Crecimiento (5y) %", value=float(default_g), step=0.5)
-        if finviz_g: st.success(f"✅ Finviz Growth: {finviz_g}%")
-
+def debug_panel():
+    """Tiempos por etapa (p50/p95 de las últimas mediciones) y aciertos de caché por función."""
+    with st.sidebar.expander("🐞 Métricas de rendimiento", expanded=True):
+        stages = metrics.registry.stages()
+        if stages:
+            st.dataframe(pd.DataFrame([{'Etapa': k, 'N': v['count'], 'Última ms': v['last'] * 1000,
+                                        'p50 ms': v['p50'] * 1000, 'p95 ms': v['p95'] * 1000} for k, v in stages.items()]),
+                         hide_index=True, use_container_width=True,
+                         column_config={c: st.column_config.NumberColumn(format="%.1f") for c in ['Última ms', 'p50 ms', 'p95 ms']})
+        caches = metrics.registry.caches()
+        if caches:
+            st.dataframe(pd.DataFrame([{'Función': k, 'Aciertos': v['hit'], 'Fallos': v['miss'], 'Expiradas': v['expiry'],
+                                        'Obsoletas': v['stale'],
+                                        'Acierto %': 100 * v['hit'] / max(sum(v.values()), 1)} for k, v in caches.items()]),
+                         hide_index=True, use_container_width=True,
+                         column_config={'Acierto %': st.column_config.NumberColumn(format="%.0f")})
+        memory = metrics.registry.memory()
+        if memory:
+            st.dataframe(pd.DataFrame([{'Caché': k, 'Entradas': v['entries'], 'MB': v['bytes'] / 2**20,
+                                        'Límite MB': v['max_bytes'] / 2**20, 'Desalojos': v['evictions']} for k, v in memory.items()]),
+                         hide_index=True, use_container_width=True,
+                         column_config={c: st.column_config.NumberColumn(format="%.1f") for c in ['MB', 'Límite MB']})
+        if watchlist_warmer:
+            last = f"{datetime.fromtimestamp(watchlist_warmer.last_run):%H:%M}" if watchlist_warmer.last_run else "en curso"
+            st.caption(f"Watchlist: {len(watchlist_warmer.tickers)} tickers, última pasada {last}")
+        st.caption("Circuitos: " + (", ".join(f"{h} {s}" for h, s in scheduler.status().items()) or "sin tráfico"))
+        st.download_button("⬇️ JSON lines", metrics.registry.to_jsonl(), file_name="metrics.jsonl", mime="application/x-ndjson")
+        st.download_button("⬇️ Prometheus", metrics.registry.to_prometheus(), file_name="metrics.prom", mime="text/plain")
+
+# --- 3. SECCIONES DE LA PÁGINA (FRAGMENTOS) ---
+
+@st.fragment
+@metrics.timer("render.header")
+def header_section(ticker, data, fair_value):
+    price, pe_mean = data.price, data.pe_mean
     # --- HEADER & VEREDICTO ---
-    st.title(f"📊 {info.get('shortName', ticker)}")
-    st.markdown(f"### **{info.get('sector', 'N/A')}**  •  {info.get('industry', 'N/A')}")
+    st.title(f"📊 {data.name}")
+    st.markdown(f"### **{data.sector or 'N/A'}**  •  {data.industry or 'N/A'}")
+    if time.time() - data.as_of > 3600:
+        st.caption(f"🕒 Datos del {datetime.fromtimestamp(data.as_of):%d/%m %H:%M}; actualizándose en segundo plano.")
     st.markdown("---")
     verdict_box(price, fair_value)
 
@@ -340,118 +300,231 @@ if ticker:
     with c1: card_html("Cotización", f"${price:.2f}")
     with c2: card_html("Valor Razonable", f"${fair_value:.2f}", f"PER Hist: {pe_mean:.1f}x", "neu")
     with c3: 
-        tgt = info.get('targetMeanPrice')
+        tgt = data.target_price
         card_html("Obj. Analistas", f"${tgt}" if tgt else "N/A", f"{((tgt-price)/price)*100:+.1f}%" if tgt else "", "pos" if tgt and tgt>price else "neg")
-    with c4: card_html("Div. Yield", f"{divs['current']*100:.2f}%")
+    with c4: card_html("Div. Yield", f"{data.dividend_yield*100:.2f}%")
+
+    st.markdown("<br>", unsafe_allow_html=True)
 
+@st.fragment
+@metrics.timer("render.projection")
+def projection_section(ticker, data, eps):
+    """Calculadora: cambiar crecimiento o PER de salida solo recalcula esta sección (y sus escenarios)."""
+    price, pe_mean, finviz_g = data.price, data.pe_mean, data.growth
     st.markdown("<br>", unsafe_allow_html=True)
+    cc1, cc2 = st.columns([1, 2])
+    with cc1:
+        st.subheader("📝 Calculadora")
+        growth_input = st.number_input("Crecimiento (5y) %", value=float(finviz_g if finviz_g else 10.0), step=0.5)
+        if finviz_g: st.success(f"✅ {data.growth_source} Growth: {finviz_g:g}%")
+        exit_pe = st.number_input("Ajustar PER Salida", value=float(round(pe_mean, 1)), step=0.5)
+        st.markdown(f"<div style='background-color:#f8f9fa; padding:15px; border-radius:10px;'>EPS: ${eps:.2f} | Growth: {growth_input}% | PER Salida: {exit_pe:.1f}x</div>", unsafe_allow_html=True)
+        f_price = projection.project_price(eps, growth_input, exit_pe)
+        cagr = projection.cagr(f_price, price)
+        st.markdown("---")
+        st.markdown(f"<div style='font-size:28px;'>Precio 2029: <b>${f_price:.2f}</b></div>", unsafe_allow_html=True)
+        st.markdown(f"<div style='font-size:28px;'>CAGR: <b style='color:{'#00b894' if cagr>10 else '#2d3436'}'>{cagr:.2f}%</b></div>", unsafe_allow_html=True)
+
+    with cc2:
+        growths, pes, grid_price, grid_cagr = get_sensitivity(ticker, float(eps), float(price), float(pe_mean))
+        sensitivity_heatmap(growths, pes, grid_price, grid_cagr)
+        sensitivity_marker(growths, pes, growth_input, exit_pe)
+
+    st.markdown("---")
+    warnings = projection.validate_projection(growth_input, exit_pe, cagr, price)
+    if warnings: 
+        for w in warnings: show_alert(w['msg'].replace(w['emphasis'], f"<b>{w['emphasis']}</b>", 1), w['type'])
+    else: show_alert("✅ Supuestos razonables", "success")
+
+    scenarios_section(eps, price, growth_input, exit_pe, cagr, data.ratios)
+
+@st.fragment
+@metrics.timer("render.scenarios")
+def scenarios_section(eps, price, growth_input, exit_pe, cagr, hist_ratios):
+    """Monte Carlo: sus supuestos solo re-ejecutan la simulación, el abanico y las tarjetas."""
+    # Supuestos del Monte Carlo (por defecto: PER min/mediana/max histórico)
+    pe_lo, pe_mode, pe_hi = montecarlo.pe_bounds(hist_ratios, exit_pe)
+    with st.expander("🎲 Supuestos Monte Carlo"):
+        g_dist = st.selectbox("Distribución crecimiento", montecarlo.GROWTH_DISTS)
+        g_sd = st.number_input("Desviación crecimiento (pp)", value=montecarlo.default_growth_sd(growth_input), step=0.5, min_value=0.0)
+        pe_dist = st.selectbox("Distribución PER salida", montecarlo.PE_DISTS)
+        pe_lo = st.number_input("PER mínimo", value=float(round(pe_lo, 1)), step=0.5)
+        pe_mode = st.number_input("PER más probable", value=float(round(pe_mode, 1)), step=0.5)
+        pe_hi = st.number_input("PER máximo", value=float(round(pe_hi, 1)), step=0.5)
+    sim = montecarlo.simulate(eps, price, growth_input, g_sd, pe_lo, pe_mode, pe_hi, g_dist, pe_dist)
+
+    st.subheader(f"🎲 Escenarios (Monte Carlo, {sim['n']:,} caminos)")
+    fan_chart(sim, price, cagr)
+    cols = st.columns(3)
+    scenarios = [("🚀 Bull (P95)", 95, "bull"), ("🎯 Base (P50)", 50, "base"), ("🐻 Bear (P5)", 5, "bear")]
+    for i, (name, q, t) in enumerate(scenarios):
+        with cols[i]: scenario_card(name, sim['price'][q], sim['cagr'][q], sim['growth'][q], sim['pe'][q], t)
+
+@st.fragment
+@metrics.timer("render.dcf")
+def dcf_section(data, growth_default):
+    """DCF en tres etapas sobre el FCF por acción y lo que descuenta el precio actual (DCF inverso)."""
+    st.markdown("---")
+    st.subheader("🏦 DCF en 3 etapas")
+    fcf, price = data.fcf_per_share, data.price
+    if not fcf or fcf <= 0:
+        st.info("ℹ️ Sin FCF positivo: el DCF no es aplicable a este ticker.")
+        return
+    d1, d2, d3, d4 = st.columns(4)
+    growth = d1.number_input("Crecimiento etapa 1 %", value=float(growth_default), step=0.5)
+    discount = d2.number_input("Tasa de descuento %", value=dcf.DISCOUNT_RATE, step=0.25)
+    terminal = d3.number_input("Crecimiento terminal %", value=dcf.TERMINAL_GROWTH, step=0.25)
+    fade = d4.number_input("Años de transición", value=dcf.FADE_YEARS, step=1, min_value=0, max_value=15)
+    if terminal >= discount:
+        show_alert("El crecimiento terminal debe ser menor que la tasa de descuento.", "warning")
+        return
+    value = dcf.dcf_value(fcf, growth, discount, terminal, fade_years=fade)
+    implied_g = dcf.implied_growth(price, fcf, discount, terminal, fade_years=fade)
+    implied_r = dcf.implied_discount(price, fcf, growth, terminal, fade_years=fade)
+    margin = projection.margin(price, value)
+
+    c1, c2, c3, c4 = st.columns(4)
+    with c1: card_html("FCF / Acción", f"${fcf:.2f}")
+    with c2: card_html("Valor DCF", f"${value:.2f}", f"{margin:+.1f}% vs precio", "pos" if margin > 0 else "neg")
+    with c3: card_html("Crec. Implícito", f"{implied_g:.1f}%" if np.isfinite(implied_g) else "N/A", "lo que descuenta el precio", "neu")
+    with c4: card_html("Rentab. Implícita", f"{implied_r:.1f}%" if np.isfinite(implied_r) else "N/A", "descuento que iguala el precio", "neu")
+    st.caption(f"💡 {dcf.HIGH_YEARS} años al {growth:g}%, {fade} años convergiendo al {terminal:g}% y valor terminal de Gordon.")
+
+@st.fragment
+@metrics.timer("render.weiss")
+def weiss_section(ticker, has_dividends):
+    st.markdown("<br>", unsafe_allow_html=True)
+    if has_dividends:
+        try:
+            weiss_years = st.select_slider("Años de historia Weiss", options=[10, 15, 20, 25, 30], value=10)
+            bands, series = get_weiss_data(ticker, weiss_years)
+            if bands:
+                # Métricas Weiss
+                c1, c2, c3 = st.columns(3)
+                c1.metric("Zona Compra (Yield Alto)", f"{bands['buy_yield']:.2f}%")
+                c2.metric("Zona Neutra", f"{bands['neutral_yield']:.2f}%")
+                c3.metric("Zona Venta (Yield Bajo)", f"{bands['sell_yield']:.2f}%")
+                weiss_chart(series, weiss_years)
+                st.caption("💡 Si el precio toca la zona sombreada verde inferior, es señal de compra.")
+            else: st.warning("Datos insuficientes para gráfico.")
+        except Exception: st.warning("Error al generar gráfico Weiss.")
+    else: st.warning("⚠️ Sin historial de dividendos suficiente.")
+
+@st.fragment
+@metrics.timer("render.valuometer")
+def valuometer_section(ticker, data, years):
+    st.markdown("<br>", unsafe_allow_html=True)
+    st.subheader("🔎 Valuómetro: ¿Cara o Barata respecto a su historia?")
+    st.markdown("Posición actual respecto al rango de los últimos 10 años.")
+    
+    metrics_check = [
+        ("PER (Price to Earnings)", data.trailing_pe, 'PER'),
+        ("Price to Sales (P/S)", data.price_to_sales, 'Price/Sales'),
+        ("Price to Book (P/B)", data.price_to_book, 'Price/Book'),
+        ("EV / EBITDA", data.ev_to_ebitda, 'EV/EBITDA'),
+        ("Price to FCF (P/FCF)", data.price_to_fcf, 'P/FCF')
+    ]
+    hist_ratios = data.ratios
+    
+    found = False
+    for label, curr, key in metrics_check:
+        if key in hist_ratios and curr is not None:
+            dat = hist_ratios[key]
+            valuation_meter(label, curr, dat['median'], dat['min'], dat['max'])
+            if dat.get('pct') is not None:
+                z = f", z-score {dat['z']:+.2f}" if dat.get('z') is not None else ""
+                st.caption(f"Último dato mensual ({dat['current']:.1f}x): percentil {dat['pct']:.0f} de su historia{z}")
+            found = True
+    
+    if not found: st.warning("⚠️ No hay suficientes datos históricos para el Valuómetro.")
+    st.markdown("---")
+    st.caption("💡 Barra Verde/Roja indica si cotiza por debajo/encima de su mediana histórica.")
+
+    # --- ¿Cuán barata ha estado mes a mes? ---
+    window = st.radio("Historia de referencia", ["Toda la disponible", f"Últimos {ROLLING_WINDOW // 12} años"], horizontal=True)
+    hist = get_ratio_history(ticker, years, None if window.startswith("Toda") else ROLLING_WINDOW)
+    if hist is None or hist.empty: st.info("ℹ️ Sin serie mensual de ratios suficiente.")
+    else: percentile_heatmap(hist, {key: label.split(" (")[0] for label, _, key in metrics_check})
+
+# --- 4. MAIN APP ---
+
+@instrumented_cache(ttl=3600, max_entries=64, show_spinner=False)
+def run_screener(tickers, growth, exit_pe, years):
+    # growth: % común o tupla ((ticker, %), ...) hashable para la caché
+    if isinstance(growth, tuple): growth = dict(growth)
+    return screener.screen(get_market_data(), list(tickers), growth, exit_pe, years)
+
+def screener_page(years_hist):
+    st.title("🧮 Screener de Universo")
+    st.markdown("Valoración en bloque: Valor Razonable (EPS × PER histórico), Precio 5A, CAGR y veredicto.")
+    with st.sidebar:
+        st.subheader("📋 Universo")
+        pasted = st.text_area("Tickers (separados por comas o líneas)", value="AAPL, MSFT, GOOGL, KO, JNJ")
+        upload = st.file_uploader("...o sube un CSV (columna 'ticker', opcional 'growth')", type="csv")
+        growth = st.number_input("Crecimiento (5y) % común", value=10.0, step=0.5)
+        use_hist_pe = st.checkbox("PER de salida = PER histórico de cada ticker", value=True)
+        exit_pe = None if use_hist_pe else st.number_input("PER Salida común", value=15.0, step=0.5)
+        sort_by = st.selectbox("Ordenar por", list(screener.SORT_KEYS))
+
+    tickers, growth_map = screener.parse_tickers(pasted), None
+    if upload is not None: tickers, growth_map = screener.tickers_from_csv(pd.read_csv(upload))
+    if not tickers:
+        st.info("Introduce al menos un ticker.")
+        return
+    if growth_map: growth = tuple(sorted(growth_map.items()))
+
+    with st.spinner(f'⚙️ Valorando {len(tickers)} tickers...'):
+        t0 = time.time()
+        try: df = screener.rank(run_screener(tuple(tickers), growth, exit_pe, years_hist), sort_by)
+        except UpstreamError as e:
+            st.error(f"⏳ Las fuentes de datos no responden ahora mismo ({e}). Inténtalo de nuevo en unos minutos.")
+            return
+    st.caption(f"{len(df)} tickers en {time.time() - t0:.1f}s")
+    st.dataframe(df, use_container_width=True, hide_index=True, column_config={
+        c: st.column_config.NumberColumn(format="%.2f") for c in ['Precio', 'EPS', 'PER Hist', 'Valor Razonable', 'Margen %', 'Precio 5A', 'CAGR %',
+                                                        'FCF/Acción', 'Valor DCF', 'Crec. Implícito %', 'Percentil PER']
+    })
+    st.download_button("⬇️ Descargar CSV", df.to_csv(index=False), file_name="screener.csv", mime="text/csv")
+
+with st.sidebar:
+    st.header("🎛️ Configuración")
+    mode = st.radio("Modo", ["📈 Ticker", "🧮 Screener"], horizontal=True)
+    if mode == "📈 Ticker": ticker = st.text_input("Ticker", value="GOOGL").upper().strip()
+    st.divider()
+    years_hist = st.slider("Años Media Histórica", 5, 10, 10)
+    debug = st.checkbox("🐞 Métricas de rendimiento", value=os.environ.get("VALOR_DEBUG") == "1")
+
+if mode == "🧮 Screener":
+    screener_page(years_hist)
+    if debug: debug_panel()
+    st.stop()
+
+if ticker:
+    try:
+        with st.spinner(f'⚙️ Procesando datos para {ticker}...'):
+            data = get_full_analysis(ticker, years_hist)
+    except UpstreamError as e:
+        st.error(f"⏳ Las fuentes de datos no responden ahora mismo ({e}). Inténtalo de nuevo en unos minutos.")
+        if debug: debug_panel()
+        st.stop()
+
+    if not data:
+        st.error("❌ Error: No se encontró el Ticker o faltan datos.")
+        if debug: debug_panel()
+        st.stop()
+        
+    eps = data.eps
+    fair_value = projection.fair_value(eps, data.pe_mean)
+
+    # Cada sección es un fragmento: sus widgets solo re-ejecutan esa sección, no la página.
+    header_section(ticker, data, fair_value)
 
     # --- TABS ---
     t1, t2, t3 = st.tabs(["🚀 PROYECCIÓN 2029", "💰 DIVIDENDOS (WEISS)", "📊 FUNDAMENTALES (VALUÓMETRO)"])
-
-    # TAB 1: PROYECCIÓN (Código ORIGINAL recuperado)
     with t1:
-        st.markdown("<br>", unsafe_allow_html=True)
-        cc1, cc2 = st.columns([1, 2])
-        with cc1:
-            st.subheader("📝 Calculadora")
-            st.markdown(f"<div style='background-color:#f8f9fa; padding:15px; border-radius:10px;'>EPS: ${eps:.2f} | Growth: {growth_input}% | PER Salida: {pe_mean:.1f}x</div>", unsafe_allow_html=True)
-            st.write("")
-            exit_pe = st.number_input("Ajustar PER Salida", value=float(round(pe_mean, 1)), step=0.5)
-            f_price = eps * ((1 + growth_input/100)**5) * exit_pe
-            cagr = ((f_price/price)**(1/5)-1)*100 if price > 0 else 0
-            st.markdown("---")
-            st.markdown(f"<div style='font-size:28px;'>Precio 2029: <b>${f_price:.2f}</b></div>", unsafe_allow_html=True)
-            st.markdown(f"<div style='font-size:28px;'>CAGR: <b style='color:{'#00b894' if cagr>10 else '#2d3436'}'>{cagr:.2f}%</b></div>", unsafe_allow_html=True)
-        
-        with cc2:
-            yrs = list(range(datetime.now().year, datetime.now().year+6))
-            vals = [price * ((1 + cagr/100)**i) for i in range(6)]
-            fig = go.Figure(go.Scatter(x=yrs, y=vals, mode='lines+markers', line=dict(color='#0984e3', width=4)))
-            fig.update_layout(title="Curva de Valor Teórico", height=400)
-            st.plotly_chart(fig, use_container_width=True)
-        
-        st.markdown("---")
-        warnings = validate_projection(growth_input, exit_pe, cagr, price)
-        if warnings: 
-            for w in warnings: show_alert(w['msg'], w['type'])
-        else: show_alert("✅ Supuestos razonables", "success")
-        
-        st.subheader("🎲 Escenarios")
-        cols = st.columns(3)
-        scenarios = [("🚀 Bull", growth_input, exit_pe, "bull"), ("🎯 Base", growth_input*0.7, exit_pe*0.8, "base"), ("🐻 Bear", growth_input*0.4, exit_pe*0.6, "bear")]
-        for i, (name, g, p, t) in enumerate(scenarios):
-            fp = eps * ((1 + g/100)**5) * p
-            cg = ((fp/price)**(1/5)-1)*100 if price>0 else 0
-            with cols[i]: scenario_card(name, fp, cg, g, p, t)
-
-    # TAB 2: WEISS (Código ORIGINAL recuperado con mejoras visuales)
-    with t2:
-        st.markdown("<br>", unsafe_allow_html=True)
-        if divs['rate'] and not divs['history'].empty:
-            try:
-                stock_obj = yf.Ticker(ticker)
-                hist_w = stock_obj.history(period="10y")
-                div_hist = divs['history']
-                if not hist_w.empty:
-                    # Lógica de construcción del gráfico Weiss
-                    div_series = div_hist.reindex(hist_w.index, method='ffill').fillna(0)
-                    df_w = pd.DataFrame(index=hist_w.index)
-                    df_w['Close'] = hist_w['Close']
-                    # Dividendo TTM aproximado
-                    daily_idx = pd.date_range(start=hist_w.index[0], end=hist_w.index[-1])
-                    div_ttm = div_hist.reindex(daily_idx).fillna(0).rolling(365).sum().reindex(hist_w.index).ffill()
-                    df_w['Yield'] = (div_ttm / df_w['Close']) * 100
-                    valid_y = df_w['Yield'][(df_w['Yield'] > 0.1) & (df_w['Yield'] < 20)]
-                    
-                    if not valid_y.empty:
-                        min_y, max_y = valid_y.quantile(0.05), valid_y.quantile(0.95)
-                        df_w['Undervalued'] = (div_ttm / max_y) * 100
-                        df_w['Overvalued'] = (div_ttm / min_y) * 100
-                        
-                        # Métricas Weiss
-                        c1, c2, c3 = st.columns(3)
-                        c1.metric("Zona Compra (Yield Alto)", f"{max_y:.2f}%")
-                        c2.metric("Zona Neutra", f"{valid_y.median():.2f}%")
-                        c3.metric("Zona Venta (Yield Bajo)", f"{min_y:.2f}%")
-                        
-                        # Gráfico con relleno
-                        fig_w = go.Figure()
-                        # Techo (Rojo)
-                        fig_w.add_trace(go.Scatter(x=df_w.index, y=df_w['Overvalued'], mode='lines', name='Zona Venta', line=dict(color='rgba(231, 76, 60, 0.5)', dash='dot')))
-                        # Suelo (Verde) + Relleno medio
-                        fig_w.add_trace(go.Scatter(x=df_w.index, y=df_w['Undervalued'], mode='lines', name='Zona Compra', line=dict(color='rgba(0, 184, 148, 0.5)', dash='dot'), fill='tonexty', fillcolor='rgba(255,255,255,0)'))
-                        # Relleno Zona Compra (abajo)
-                        fig_w.add_trace(go.Scatter(x=df_w.index, y=df_w['Undervalued']*0.01, mode='lines', line=dict(width=0), showlegend=False)) # Base falsa
-                        fig_w.add_trace(go.Scatter(x=df_w.index, y=df_w['Undervalued'], mode='lines', line=dict(width=0), fill='tonexty', fillcolor='rgba(0, 184, 148, 0.1)', showlegend=False))
-                        
-                        fig_w.add_trace(go.Scatter(x=df_w.index, y=df_w['Close'], mode='lines', name='Precio', line=dict(color='#2d3436', width=2)))
-                        fig_w.update_layout(title="Canal de Valoración Geraldine Weiss (10Y)", height=500, yaxis_range=[df_w['Close'].min()*0.8, df_w['Close'].max()*1.2])
-                        st.plotly_chart(fig_w, use_container_width=True)
-                        st.caption("💡 Si el precio toca la zona sombreada verde inferior, es señal de compra.")
-                    else: st.warning("Datos insuficientes para gráfico.")
-            except: st.warning("Error al generar gráfico Weiss.")
-        else: st.warning("⚠️ Sin historial de dividendos suficiente.")
-
-    # TAB 3: FUNDAMENTALES (NUEVO VALUÓMETRO)
-    with t3:
-        st.markdown("<br>", unsafe_allow_html=True)
-        st.subheader("🔎 Valuómetro: ¿Cara o Barata respecto a su historia?")
-        st.markdown("Posición actual respecto al rango de los últimos 10 años.")
-        
-        metrics_check = [
-            ("PER (Price to Earnings)", info.get('trailingPE'), 'PER'),
-            ("Price to Sales (P/S)", info.get('priceToSalesTrailing12Months'), 'Price/Sales'),
-            ("Price to Book (P/B)", info.get('priceToBook'), 'Price/Book')
-        ]
-        
-        found = False
-        for label, curr, key in metrics_check:
-            if key in hist_ratios and curr is not None:
-                dat = hist_ratios[key]
-                valuation_meter(label, curr, dat['median'], dat['min'], dat['max'])
-                found = True
-        
-        if not found: st.warning("⚠️ No hay suficientes datos históricos para el Valuómetro.")
-        st.markdown("---")
-        st.caption("💡 Barra Verde/Roja indica si cotiza por debajo/encima de su mediana histórica.")
+        projection_section(ticker, data, eps)
+        dcf_section(data, data.growth or 10.0)
+    with t2: weiss_section(ticker, data.has_dividends)
+    with t3: valuometer_section(ticker, data, years_hist)
+
+if debug: debug_panel()
@@ -0,0 +1,87 @@
+"""
+Fixtures de mercado para los benchmarks, en el formato de valuation.fixtures.RecordedTicker.
+
+Cuatro arquetipos deterministas (semilla fija) cubren los casos que más pesan:
+    SHORT     3 años de historia, sin dividendos (salida a bolsa reciente)
+    LONG      30 años de historia, dividendo trimestral
+    DIVHEAVY  15 años, dividendo mensual con rentabilidad alta
+    SPARSE    10 años, solo estados anuales, sin flujo de caja ni EBITDA
+Cada arquetipo incluye también las páginas de Finviz y StockAnalysis que sirve el
+servidor HTTP local. Con --fixtures se pueden usar grabaciones reales (valuation.fixtures.record).
+"""
+import json
+import os
+
+import numpy as np
+import pandas as pd
+
+END = "2026-06-30"
+ARCHETYPES = {
+    'SHORT': {'years': 3, 'div_every': None, 'div': 0.0, 'quarterly': True, 'cashflow': True, 'growth': "18.50%"},
+    'LONG': {'years': 30, 'div_every': 63, 'div': 0.45, 'quarterly': True, 'cashflow': True, 'growth': "7.20%"},
+    'DIVHEAVY': {'years': 15, 'div_every': 21, 'div': 0.30, 'quarterly': True, 'cashflow': True, 'growth': "3.10%"},
+    'SPARSE': {'years': 10, 'div_every': 126, 'div': 0.20, 'quarterly': False, 'cashflow': False, 'growth': "-"},
+}
+# Relleno para que las páginas pesen como las reales (~100 KB).
+_FILLER = "<tr><td class='snapshot-td2'>Dato</td><td class='snapshot-td2'><b>1.00</b></td></tr>" * 1200
+
+
+def _history(spec, rng):
+    idx = pd.bdate_range(end=END, periods=252 * spec['years'])
+    close = 40 * np.exp(np.cumsum(rng.normal(0.0003, 0.015, len(idx))))
+    hist = pd.DataFrame({'Open': close, 'High': close * 1.01, 'Low': close * 0.99, 'Close': close,
+                         'Adj Close': close, 'Volume': 1e6, 'Dividends': 0.0, 'Stock Splits': 0.0}, index=idx)
+    hist.index.name = 'Date'
+    if spec['div_every']: hist.iloc[::spec['div_every'], hist.columns.get_loc('Dividends')] = spec['div']
+    return hist
+
+
+def _statement(freq, n, rng, items):
+    periods = pd.date_range(end=END, periods=n, freq=freq)[::-1]
+    scale = 0.25 if freq == 'QE' else 1.0
+    data = {}
+    for i, p in enumerate(periods):
+        g = (1 - 0.02 * i)
+        row = {'Diluted EPS': 2.0 * scale * g, 'Basic EPS': 2.1 * scale * g, 'Total Revenue': 4e9 * scale * g,
+               'EBITDA': 1.2e9 * scale * g, 'Basic Average Shares': 5e8, 'Ordinary Shares Number': 5e8,
+               'Total Assets': 9e9, 'Total Liabilities Net Minority Interest': 5e9 + rng.normal(0, 1e8),
+               'Total Debt': 2e9, 'Cash And Cash Equivalents': 8e8, 'Free Cash Flow': 7e8 * scale * g}
+        data[p] = {k: v for k, v in row.items() if k in items}
+    return pd.DataFrame(data)
+
+
+def build(root):
+    """Genera (si no existen) los arquetipos en `root`. Devuelve `root`."""
+    for seed, (name, spec) in enumerate(ARCHETYPES.items()):
+        folder = os.path.join(root, name)
+        if os.path.exists(os.path.join(folder, "info.json")): continue
+        os.makedirs(folder, exist_ok=True)
+        rng = np.random.default_rng(seed)
+        hist = _history(spec, rng)
+        hist.to_csv(os.path.join(folder, "history.csv"))
+
+        income = ['Diluted EPS', 'Basic EPS', 'Total Revenue', 'Basic Average Shares', 'Ordinary Shares Number']
+        if spec['cashflow']: income.append('EBITDA')
+        balance = ['Total Assets', 'Total Liabilities Net Minority Interest', 'Total Debt', 'Cash And Cash Equivalents']
+        statements = {'financials': ('YE', 4, income), 'balance_sheet': ('YE', 4, balance)}
+        if spec['quarterly']:
+            statements.update({'quarterly_financials': ('QE', 6, income), 'quarterly_balance_sheet': ('QE', 6, balance)})
+        if spec['cashflow']:
+            statements.update({'cashflow': ('YE', 4, ['Free Cash Flow']), 'quarterly_cashflow': ('QE', 6, ['Free Cash Flow'])})
+        for stmt, (freq, n, items) in statements.items():
+            _statement(freq, n, rng, items).to_csv(os.path.join(folder, f"{stmt}.csv"))
+
+        price = float(hist['Close'].iloc[-1])
+        ttm_div = float(hist['Dividends'].iloc[-252:].sum())
+        info = {'shortName': f"{name.title()} Corp", 'sector': 'Benchmark', 'industry': 'Fixtures',
+                'currentPrice': price, 'trailingEps': 2.0, 'forwardEps': 2.2, 'trailingPE': price / 2.0,
+                'priceToSalesTrailing12Months': price * 5e8 / 4e9, 'priceToBook': price * 5e8 / 4e9,
+                'dividendRate': ttm_div, 'targetMeanPrice': price * 1.1,
+                'marketCap': price * 5e8, 'freeCashflow': 7e8, 'enterpriseToEbitda': 11.0}
+        with open(os.path.join(folder, "info.json"), "w") as f: json.dump(info, f)
+
+        finviz = f"<html><body><table>{_FILLER}<tr><td class='snapshot-td2'><a>EPS next 5Y</a></td><td class='snapshot-td2'><b><span>{spec['growth']}</span></b></td></tr>{_FILLER}</table></body></html>"
+        with open(os.path.join(folder, "finviz.html"), "w") as f: f.write(finviz)
+        with open(os.path.join(folder, "stockanalysis.html"), "w") as f:
+            f.write(f"<html><body>{_FILLER}<p>EPS is forecast to grow 6.40% annual over five years.</p></body></html>")
+    return root
@@ -0,0 +1,235 @@
+"""
+Suite de benchmarks offline: reproduce respuestas grabadas de yfinance/Finviz/StockAnalysis,
+mide tiempo y pico de memoria de cada etapa para 1, 50 y 500 tickers y falla si alguna
+empeora más allá de la tolerancia respecto a benchmarks/baseline.json.
+
+    python -m benchmarks.run                          # compara contra la baseline
+    python -m benchmarks.run --sizes 1 50 --update-baseline
+    python -m benchmarks.run --fixtures grabaciones/  # grabaciones reales (valuation.fixtures.record)
+"""
+import argparse
+import gc
+import json
+import os
+import sys
+import tempfile
+import threading
+import time
+import tracemalloc
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import numpy as np
+import pandas as pd
+
+from benchmarks import fixtures
+from valuation import analysis, dcf, screener, weiss
+from valuation.data import MarketData
+from valuation.fixtures import RecordedTicker
+from valuation.growth import GrowthEstimator, Provider, parse_finviz, parse_stockanalysis
+from valuation.ratios import robust_ratios
+from valuation.store import MarketStore
+
+BASELINE = os.path.join(os.path.dirname(__file__), "baseline.json")
+SIZES = (1, 50, 500)
+TOLERANCE = 0.5       # +50% de tiempo o memoria sobre la baseline = regresión
+MIN_SECONDS = 0.01    # por ejecución: por debajo domina el ruido incluso tras la calibración
+REPEATS = 5           # muestras cronometradas por etapa; se compara la mediana
+MIN_SAMPLE = 0.5      # s: las etapas rápidas se repiten dentro de cada muestra hasta alcanzarlo
+BUDGET = 60.0         # s cronometrados por etapa: las lentas (500 tickers) se quedan con menos muestras
+MIN_PEAK_MB = 1.0     # idem para la memoria
+LONG_YEARS = {'LONG': 30}
+REVERSE_DCF_ROWS = 10_000  # filas del lote del DCF inverso
+
+
+# --- Entorno offline ---
+
+def _serve(root):
+    """Servidor HTTP local que sustituye a Finviz y StockAnalysis."""
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            if self.path.startswith("/quote.ashx"): ticker, page = self.path.split("t=")[-1], "finviz.html"
+            else: ticker, page = self.path.strip("/").split("/")[1].upper(), "stockanalysis.html"
+            path = os.path.join(root, self.server.aliases.get(ticker, ticker), page)
+            if not os.path.exists(path):
+                self.send_response(404)
+                self.end_headers()
+                return
+            with open(path, "rb") as f: body = f.read()
+            self.send_response(200)
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args): pass
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    server.aliases = {}
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def universe(n, archetypes):
+    """`n` tickers ficticios que rotan entre los arquetipos: {ticker: arquetipo}."""
+    return {f"{archetypes[i % len(archetypes)]}{i:04d}": archetypes[i % len(archetypes)] for i in range(n)}
+
+
+def _store(ctx, path):
+    aliases, root = ctx['aliases'], ctx['root']
+    return MarketStore(path, ticker_factory=lambda t: RecordedTicker(aliases.get(t, t), root),
+                       ttl=1e12, clock=lambda: ctx['now'])
+
+
+def _estimator(ctx):
+    base = ctx['base_url']
+    return GrowthEstimator([Provider("Finviz", base, "/quote.ashx?t={ticker}", parse_finviz),
+                            Provider("StockAnalysis", base, "/stocks/{ticker_lower}/forecast/", parse_stockanalysis)])
+
+
+# --- Etapas ---
+
+def stage_store_cold(ctx):
+    """Carga completa desde las respuestas grabadas a un almacén vacío."""
+    with tempfile.NamedTemporaryFile(dir=ctx['tmp'], suffix=".sqlite", delete=False) as f: ctx['store_path'] = f.name
+    store = _store(ctx, ctx['store_path'])
+    for t, arch in ctx['tickers'].items(): store.refresh(t, years=LONG_YEARS.get(arch, 10))
+
+
+def stage_ratios(ctx):
+    market = MarketData(_store(ctx, ctx['store_path']))
+    for t in ctx['tickers']: robust_ratios(market, t, 10)
+
+
+def stage_full_analysis(ctx):
+    market, estimator = MarketData(_store(ctx, ctx['store_path'])), _estimator(ctx)
+    ctx['analyses'] = [analysis.full_analysis(market, t, 10, growth=estimator.estimate) for t in ctx['tickers']]
+
+
+def stage_projection(ctx):
+    for a in ctx['analyses']:
+        if a: analysis.valuation_report(a)
+
+
+def stage_reverse_dcf(ctx):
+    """
+    Crecimiento y descuento implícitos en una llamada cada uno, sobre el universo repetido hasta
+    REVERSE_DCF_ROWS filas: con pocos tickers el tiempo quedaría por debajo de MIN_SECONDS.
+    """
+    rows = [(a.price, a.fcf_per_share if a.fcf_per_share is not None else np.nan) for a in ctx['analyses'] if a]
+    price, fcf = (np.resize(col, REVERSE_DCF_ROWS) for col in np.array(rows, dtype=float).reshape(-1, 2).T)
+    dcf.implied_growth(price, fcf)
+    dcf.implied_discount(price, fcf, analysis.DEFAULT_GROWTH)
+
+
+def stage_weiss(ctx):
+    market = MarketData(_store(ctx, ctx['store_path']))
+    for t, arch in ctx['tickers'].items():
+        years = LONG_YEARS.get(arch, 10)
+        bands = weiss.weiss_bands(market.history(t, years, interval="1d")['Close'], market.dividends(t, years))
+        if bands: weiss.chart_series(bands)
+
+
+def stage_screener(ctx):
+    screener.screen(MarketData(_store(ctx, ctx['store_path'])), list(ctx['tickers']))
+
+
+STAGES = [('store_cold', stage_store_cold), ('ratios', stage_ratios), ('full_analysis', stage_full_analysis),
+          ('projection', stage_projection), ('reverse_dcf', stage_reverse_dcf), ('weiss', stage_weiss),
+          ('screener', stage_screener)]
+
+
+# --- Medición ---
+
+def measure(fn, ctx, memory=True, repeats=REPEATS):
+    """
+    Segundos por ejecución (mediana de `repeats` muestras) y pico de memoria. La primera pasada
+    calienta (imports, sesiones HTTP, cachés del sistema) y, con `memory`, mide el pico bajo
+    tracemalloc, que ralentiza y no contamina el tiempo. Como timeit.autorange, una etapa
+    que no llega a MIN_SAMPLE se repite dentro de cada muestra y se divide por las repeticiones.
+    """
+    peak_mb = None
+    gc.collect()
+    if memory: tracemalloc.start()
+    fn(ctx)
+    if memory:
+        peak_mb = tracemalloc.get_traced_memory()[1] / 2**20
+        tracemalloc.stop()
+
+    number, samples, start = 1, [], time.perf_counter()
+    while len(samples) < repeats and (not samples or time.perf_counter() - start < BUDGET):
+        gc.collect()
+        t0 = time.perf_counter()
+        for _ in range(number): fn(ctx)
+        elapsed = time.perf_counter() - t0
+        if not samples and elapsed < MIN_SAMPLE and number == 1:
+            number = int(np.ceil(MIN_SAMPLE / max(elapsed, 1e-6)))  # calibración: la muestra se descarta
+            continue
+        samples.append(elapsed / number)
+    return {'seconds': round(float(np.median(samples)), 4), 'peak_mb': None if peak_mb is None else round(peak_mb, 2)}
+
+
+def run(sizes, root, memory=True):
+    server = _serve(root)
+    archetypes = sorted(d for d in os.listdir(root) if os.path.exists(os.path.join(root, d, "history.csv")))
+    results = {}
+    try:
+        with tempfile.TemporaryDirectory() as tmp:
+            for n in sizes:
+                tickers = universe(n, archetypes)
+                server.aliases = tickers
+                ctx = {'tickers': tickers, 'aliases': tickers, 'root': root, 'tmp': tmp,
+                       'base_url': f"http://127.0.0.1:{server.server_port}",
+                       'now': (pd.Timestamp(fixtures.END) + pd.Timedelta(hours=20)).timestamp()}
+                for name, fn in STAGES:
+                    results[f"{name}@{n}"] = measure(fn, ctx, memory)
+                    print(f"{name + '@' + str(n):<22} {results[f'{name}@{n}']['seconds']:>9.3f}s"
+                          f"  {results[f'{name}@{n}']['peak_mb'] or 0:>9.1f} MB", flush=True)
+    finally:
+        server.shutdown()
+    return results
+
+
+def regressions(results, baseline, tolerance=TOLERANCE):
+    """Lista de (clave, métrica, actual, baseline) que superan la tolerancia."""
+    out = []
+    for key, cur in results.items():
+        base = baseline.get(key)
+        if not base: continue
+        if cur['seconds'] > MIN_SECONDS and cur['seconds'] > base['seconds'] * (1 + tolerance):
+            out.append((key, 'seconds', cur['seconds'], base['seconds']))
+        if cur['peak_mb'] and base.get('peak_mb') and cur['peak_mb'] > MIN_PEAK_MB \
+                and cur['peak_mb'] > base['peak_mb'] * (1 + tolerance):
+            out.append((key, 'peak_mb', cur['peak_mb'], base['peak_mb']))
+    return out
+
+
+def main(argv=None):
+    p = argparse.ArgumentParser(prog="python -m benchmarks.run", description=__doc__.strip().splitlines()[0])
+    p.add_argument("--sizes", type=int, nargs="+", default=list(SIZES))
+    p.add_argument("--fixtures", help="Directorio de fixtures (por defecto se generan los arquetipos)")
+    p.add_argument("--baseline", default=BASELINE)
+    p.add_argument("--tolerance", type=float, default=TOLERANCE)
+    p.add_argument("--update-baseline", action="store_true", help="Guardar los resultados como nueva baseline")
+    p.add_argument("--no-memory", action="store_true", help="No medir memoria (más rápido)")
+    args = p.parse_args(argv)
+
+    with tempfile.TemporaryDirectory() as generated:
+        root = args.fixtures or fixtures.build(generated)
+        results = run(args.sizes, root, memory=not args.no_memory)
+
+    baseline = {}
+    if os.path.exists(args.baseline):
+        with open(args.baseline) as f: baseline = json.load(f)
+    if args.update_baseline:
+        baseline.update(results)
+        with open(args.baseline, "w") as f: json.dump(baseline, f, indent=2, sort_keys=True)
+        print(f"Baseline actualizada: {args.baseline}")
+        return 0
+
+    bad = regressions(results, baseline, args.tolerance)
+    for key, metric, cur, base in bad:
+        print(f"REGRESIÓN {key} {metric}: {cur} (baseline {base}, tolerancia +{args.tolerance:.0%})")
+    return 1 if bad else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
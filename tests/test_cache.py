@@ -0,0 +1,54 @@
+import threading
+import time
+
+from valuation.cache import SharedCache, SQLiteBackend
+
+
+def _caches(path, n=2):
+    # Instancias independientes sobre el mismo fichero: como procesos distintos de la app.
+    return [SharedCache(SQLiteBackend(str(path)), poll=0.005, local_bytes=0) for _ in range(n)]
+
+
+def test_concurrent_get_or_compute_computes_once(tmp_path):
+    for trial in range(20):
+        caches, calls = _caches(tmp_path / f"shared{trial}.sqlite", 4), []
+        barrier = threading.Barrier(len(caches))
+
+        def compute():
+            calls.append(1)
+            time.sleep(0.01)
+            return 42
+
+        def worker(cache, out):
+            barrier.wait()
+            out.append(cache.get_or_compute("f", "f:key", compute, ttl=60))
+
+        results = []
+        threads = [threading.Thread(target=worker, args=(c, results)) for c in caches]
+        for t in threads: t.start()
+        for t in threads: t.join()
+        assert results == [42] * len(caches)
+        assert len(calls) == 1, f"intento {trial}: compute se ejecutó {len(calls)} veces"
+
+
+def test_stale_value_is_served_while_revalidating(tmp_path):
+    cache = _caches(tmp_path / "shared.sqlite", 1)[0]
+    values = iter(["old", "new"])
+    compute = lambda: next(values)
+    assert cache.get_or_compute("f", "f:key", compute, ttl=0.05, stale_ttl=60) == "old"
+    time.sleep(0.1)
+
+    # Caducado pero dentro de stale_ttl: se devuelve al instante y se refresca en segundo plano.
+    assert cache.get_or_compute("f", "f:key", compute, ttl=60, stale_ttl=60) == "old"
+    deadline = time.time() + 5
+    while cache._lookup("f:key")[0] != 'hit' and time.time() < deadline: time.sleep(0.01)
+    assert cache.get_or_compute("f", "f:key", compute, ttl=60, stale_ttl=60) == "new"
+
+
+def test_ttl_can_depend_on_the_value(tmp_path):
+    cache = _caches(tmp_path / "shared.sqlite", 1)[0]
+    values = iter(["stale data", "fresh data"])
+    ttl = lambda value: 0.05 if value == "stale data" else 60
+    assert cache.get_or_compute("f", "f:key", lambda: next(values), ttl) == "stale data"
+    time.sleep(0.1)
+    assert cache.get_or_compute("f", "f:key", lambda: next(values), ttl) == "fresh data"
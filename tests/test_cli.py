@@ -0,0 +1,20 @@
+import functools
+import json
+
+from benchmarks import fixtures
+from valuation import cli, store
+from valuation.fixtures import RecordedTicker
+
+
+def test_blank_growth_cell_falls_back_to_the_estimate(tmp_path, monkeypatch):
+    root = str(tmp_path / "fx")
+    fixtures.build(root)
+    monkeypatch.setattr(store, "MarketStore", functools.partial(store.MarketStore, ticker_factory=lambda t: RecordedTicker(t, root)))
+    (tmp_path / "universe.csv").write_text("ticker,growth\nLONG,8\nDIVHEAVY,\n")
+    out = tmp_path / "out.json"
+
+    assert cli.main(["--file", str(tmp_path / "universe.csv"), "--format", "json", "--out", str(out),
+                     "--store", str(tmp_path / "market.sqlite"), "--years", "5"]) == 0
+    reports = {r['ticker']: r for r in json.loads(out.read_text())}
+    assert reports['LONG']['growth_pct'] == 8.0
+    assert 'error' not in reports['DIVHEAVY'] and reports['DIVHEAVY']['growth_pct'] is not None
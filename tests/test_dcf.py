@@ -0,0 +1,32 @@
+import numpy as np
+import pandas as pd
+
+from valuation import analysis, dcf
+from valuation.records import AnalysisRecord
+
+INFO = {'currentPrice': 100.0, 'trailingEps': 5.0, 'shortName': 'AAA'}
+DCF_FIELDS = ('dcf_value', 'dcf_margin_pct', 'implied_growth_pct', 'implied_discount_pct')
+
+
+def _report(fcf_per_share):
+    record = AnalysisRecord.build('AAA', INFO, {}, pd.Series(dtype=float), fcf_per_share=fcf_per_share)
+    return analysis.valuation_report(record)
+
+
+def test_batched_solver_recovers_growth_and_discount():
+    rng = np.random.default_rng(0)
+    fcf, growth, discount = rng.uniform(0.5, 10, 1000), rng.uniform(-10, 40, 1000), rng.uniform(6, 14, 1000)
+    price = dcf.dcf_value(fcf, growth, discount)
+    np.testing.assert_allclose(dcf.implied_growth(price, fcf, discount), growth, atol=1e-5)
+    np.testing.assert_allclose(dcf.implied_discount(price, fcf, growth), discount, atol=1e-5)
+
+
+def test_report_has_no_dcf_without_positive_fcf():
+    for fcf in (None, 0.0, -2.0):
+        report = _report(fcf)
+        assert all(report[k] is None for k in DCF_FIELDS)
+
+
+def test_report_dcf_fields_are_finite_or_none():
+    report = _report(80.0)  # precio muy por debajo del DCF: no hay descuento implícito en rango
+    assert report['dcf_value'] > 100 and report['implied_discount_pct'] is None
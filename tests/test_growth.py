@@ -0,0 +1,100 @@
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+from valuation.growth import GrowthEstimator, Provider, parse_finviz, parse_stockanalysis
+from valuation.upstream import Upstream, UpstreamError
+
+
+def _finviz(value):
+    return f"<tr><td class='snapshot-td2'><a>EPS next 5Y</a></td><td class='snapshot-td2'><b><span>{value}</span></b></td></tr>"
+
+
+@pytest.fixture
+def server():
+    """Servidor HTTP local en lugar de Finviz/StockAnalysis: {ruta: (estado, cuerpo)} y peticiones recibidas."""
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            self.server.hits.append(self.path)
+            status, body = self.server.pages.get(self.path, (404, ""))
+            body = body.encode()
+            self.send_response(status)
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args): pass
+
+    srv = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    srv.pages, srv.hits = {}, []
+    srv.base_url = f"http://127.0.0.1:{srv.server_port}"
+    threading.Thread(target=srv.serve_forever, daemon=True).start()
+    yield srv
+    srv.shutdown()
+
+
+def _providers(server, slow=0.0):
+    def slow_parser(content):
+        time.sleep(slow)
+        return parse_stockanalysis(content)
+    return [Provider("Finviz", server.base_url, "/quote.ashx?t={ticker}", parse_finviz),
+            Provider("StockAnalysis", server.base_url, "/stocks/{ticker_lower}/forecast/", slow_parser)]
+
+
+def _estimator(server, slow=0.0, **kwargs):
+    return GrowthEstimator(_providers(server, slow), upstream=Upstream({}, retries=0, sleep=lambda s: None), **kwargs)
+
+
+def test_parse_finviz():
+    assert parse_finviz(_finviz("12.50%").encode()) == 12.5
+    assert parse_finviz(b"<td>EPS next 5Y</td>\n  <td class='x'>-3.2%</td>") == -3.2
+    assert parse_finviz(_finviz("-").encode()) is None
+    assert parse_finviz(b"<td>EPS next Y</td><td>8%</td>") is None
+
+
+@pytest.mark.parametrize("mode, expected", [('median', 6.0), ('mean', 7.0)])
+def test_consensus_modes(server, mode, expected):
+    server.pages = {"/quote.ashx?t=AAA": (200, _finviz("12.00%")),
+                    "/stocks/aaa/forecast/": (200, "<p>EPS will grow 6.00% annual</p>"),
+                    "/alt/aaa/": (200, "<p>3.0% average</p>")}
+    estimator = _estimator(server, mode=mode)
+    estimator.providers.append(Provider("Alt", server.base_url, "/alt/{ticker_lower}/", parse_stockanalysis))
+    value, source = estimator.estimate("AAA")
+    assert value == expected
+    assert sorted(source.removeprefix("Consenso (").removesuffix(")").split(", ")) == ["Alt", "Finviz", "StockAnalysis"]
+
+
+def test_first_mode_returns_the_fastest_valid_answer(server):
+    server.pages = {"/quote.ashx?t=AAA": (200, _finviz("12.00%")),
+                    "/stocks/aaa/forecast/": (200, "<p>EPS will grow 6.00% annual</p>")}
+    assert _estimator(server, slow=0.5, mode='first').estimate("AAA") == (12.0, "Finviz")
+
+
+def test_missing_data_is_cached_for_the_negative_ttl(server):
+    estimator = _estimator(server)
+    assert estimator.estimate("AAA") == (None, None)
+    assert estimator.estimate("AAA") == (None, None)
+    assert len(server.hits) == 2  # una por proveedor: la segunda consulta sale de la caché negativa
+
+    estimator = _estimator(server, negative_ttl=0)
+    estimator.estimate("AAA")
+    estimator.estimate("AAA")
+    assert len(server.hits) == 6
+
+
+def test_transient_failures_raise_and_are_not_cached(server):
+    server.pages = {"/quote.ashx?t=AAA": (503, ""), "/stocks/aaa/forecast/": (503, "")}
+    estimator = _estimator(server)
+    with pytest.raises(UpstreamError): estimator.estimate("AAA")
+    server.pages = {"/quote.ashx?t=AAA": (200, _finviz("12.00%"))}
+    assert estimator.estimate("AAA") == (12.0, "Finviz")
+
+
+def test_estimate_gives_up_at_timeout_plus_one_second(server):
+    server.pages = {"/stocks/aaa/forecast/": (200, "<p>EPS will grow 6.00% annual</p>")}
+    estimator = _estimator(server, slow=3.0, timeout=0.2)
+    start = time.monotonic()
+    with pytest.raises(UpstreamError, match="StockAnalysis"): estimator.estimate("AAA")
+    assert 1.1 <= time.monotonic() - start < 2.5
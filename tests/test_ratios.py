@@ -0,0 +1,40 @@
+import json
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from valuation.cli import write_reports
+from valuation.ratios import MIN_PERIODS, rank_series, summarize
+
+
+def test_short_history_has_no_percentile_and_serializes_as_json(tmp_path):
+    df = pd.DataFrame({'PER': [20.0, 21.0, 19.0, 22.0]}, index=pd.date_range("2024-01-31", periods=4, freq="ME"))
+    per = summarize(df)['PER']
+    assert per['pct'] is None and per['z'] is None
+    assert per['current'] == 22.0
+
+    path = tmp_path / "out.json"
+    with open(path, "w") as f: write_reports([{'ticker': 'AAA', 'ratios': {'PER': per}}], "json", f)
+    assert json.loads(path.read_text())[0]['ratios']['PER']['pct'] is None
+
+
+def test_constant_history_has_percentile_but_no_z_score():
+    # 17.3 no es representable en binario: con sumas sin desplazar daba z ~ ±1e-8 en vez de None.
+    df = pd.DataFrame({'PER': np.full(24, 17.3)}, index=pd.date_range("2020-01-31", periods=24, freq="ME"))
+    per = summarize(df)['PER']
+    assert per['pct'] == 100 * 12.5 / 24 and per['z'] is None
+    assert np.isnan(rank_series(np.full(100, 17.3), window=60)[1]).all()
+
+
+@pytest.mark.parametrize("window", [None, 60])
+def test_percentile_matches_pandas_rank(window):
+    rng = np.random.default_rng(0)
+    values = np.round(rng.normal(20, 4, 200), 0)  # redondeo: muchos empates
+    values[rng.choice(200, 20, replace=False)] = np.nan
+    pct, _ = rank_series(values, window)
+
+    valid = pd.Series(values).dropna()
+    roll = valid.expanding(MIN_PERIODS) if window is None else valid.rolling(window, MIN_PERIODS)
+    expected = (roll.rank(pct=True) * 100).reindex(range(len(values)))
+    np.testing.assert_allclose(pct, expected.to_numpy(), equal_nan=True)
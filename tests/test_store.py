@@ -0,0 +1,88 @@
+import os
+
+import pandas as pd
+
+from benchmarks import fixtures
+from valuation.analysis import full_analysis
+from valuation.data import MarketData
+from valuation.fixtures import RecordedTicker
+from valuation.store import MarketStore
+from valuation.upstream import Upstream
+
+DAY = 86400
+
+
+def _history(folder, start, end, splits=None):
+    dates = pd.bdate_range(start, end)
+    df = pd.DataFrame({'Close': range(100, 100 + len(dates)), 'Dividends': 0.0, 'Stock Splits': 0.0},
+                      index=pd.DatetimeIndex(dates, name='Date'))
+    for date, ratio in (splits or {}).items(): df.loc[pd.Timestamp(date), 'Stock Splits'] = ratio
+    path = os.path.join(folder, "history.csv")
+    if os.path.exists(path): df = pd.concat([pd.read_csv(path, index_col=0, parse_dates=True), df])
+    df.to_csv(path)
+
+
+class _Down:
+    """Ticker con Yahoo caído: cualquier petición falla como un error de red."""
+    def __getattr__(self, name): raise ConnectionError("Yahoo no responde")
+
+
+def _setup(tmp_path, now):
+    folder = tmp_path / "fx" / "AAA"
+    folder.mkdir(parents=True)
+    recorded = RecordedTicker("AAA", str(tmp_path / "fx"))
+    clock = [pd.Timestamp(now).timestamp()]
+    store = MarketStore(str(tmp_path / "market.sqlite"), ticker_factory=lambda t: recorded, clock=lambda: clock[0])
+    return str(folder), recorded, clock, store
+
+
+def test_prices_fetch_only_the_delta_and_reload_on_split(tmp_path):
+    folder, recorded, clock, store = _setup(tmp_path, "2024-03-30")
+    _history(folder, "2024-01-02", "2024-03-29")
+    store.history("AAA", 10, interval="1d")
+    assert recorded.calls == [('history', '10y')]
+
+    store.history("AAA", 10, interval="1d")  # dentro del TTL: sin petición
+    assert len(recorded.calls) == 1
+
+    _history(folder, "2024-04-01", "2024-04-05")
+    clock[0] += 7 * DAY
+    hist = store.history("AAA", 10, interval="1d")
+    assert recorded.calls[-1] == ('history', '2024-03-29')
+    assert hist.index[-1] == pd.Timestamp("2024-04-05")
+
+    _history(folder, "2024-04-08", "2024-04-08", splits={"2024-04-08": 2.0})
+    clock[0] += 3 * DAY
+    store.history("AAA", 10, interval="1d")
+    assert recorded.calls[-2:] == [('history', '2024-04-05'), ('history', '10y')]
+
+
+def test_statements_are_refetched_only_when_a_new_period_is_due(tmp_path):
+    folder, recorded, clock, store = _setup(tmp_path, "2024-03-30")
+    pd.DataFrame({pd.Timestamp("2023-12-31"): [1.5]}, index=['Diluted EPS']).to_csv(os.path.join(folder, "quarterly_financials.csv"))
+    fetches = lambda: recorded.calls.count(('quarterly_financials', None))
+
+    assert store.statement("AAA", "quarterly_financials").loc['Diluted EPS'].iloc[0] == 1.5
+    assert fetches() == 1
+
+    clock[0] += 2 * DAY  # TTL caducado, pero el próximo trimestre aún no se habrá publicado
+    store.statement("AAA", "quarterly_financials")
+    assert fetches() == 1
+
+    clock[0] = pd.Timestamp("2024-06-01").timestamp()  # 153 días tras el cierre: toca
+    store.statement("AAA", "quarterly_financials")
+    assert fetches() == 2
+
+
+def test_outage_serves_stored_data_with_its_own_date(tmp_path):
+    root = str(tmp_path / "fx")
+    fixtures.build(root)
+    clock, factory = [pd.Timestamp(fixtures.END).timestamp()], [lambda t: RecordedTicker(t, root)]
+    store = MarketStore(str(tmp_path / "market.sqlite"), ticker_factory=lambda t: factory[0](t), clock=lambda: clock[0],
+                        upstream=Upstream({}, retries=0))
+    fetched = clock[0]
+    assert full_analysis(MarketData(store), "LONG").as_of == fetched
+
+    factory[0], clock[0] = lambda t: _Down(), clock[0] + 2 * DAY
+    record = full_analysis(MarketData(store), "LONG")
+    assert record.price > 0 and record.as_of == fetched  # datos guardados, con su fecha: no "de ahora"
@@ -0,0 +1,46 @@
+import pytest
+import requests
+
+from valuation.upstream import Upstream, UpstreamError, is_transient
+
+
+def _upstream():
+    return Upstream({}, retries=2, threshold=2, sleep=lambda s: None, seed=0)
+
+
+def _http_error(status):
+    response = requests.Response()
+    response.status_code = status
+    return requests.HTTPError(response=response)
+
+
+def test_classifies_transient_errors():
+    assert is_transient(requests.ConnectionError()) and is_transient(requests.Timeout())
+    assert is_transient(_http_error(429)) and is_transient(_http_error(503))
+    assert not is_transient(_http_error(404))
+    assert not is_transient(ValueError("sin datos"))
+
+
+def test_permanent_errors_are_not_retried_nor_open_the_circuit():
+    up, calls = _upstream(), []
+
+    def bad_ticker():
+        calls.append(1)
+        raise ValueError("ticker inexistente")
+
+    for _ in range(5):
+        with pytest.raises(ValueError): up.call("yahoo", bad_ticker)
+    assert len(calls) == 5
+    assert up.status() == {'yahoo': 'closed'}
+
+
+def test_transient_errors_are_retried_and_open_the_circuit():
+    up, calls = _upstream(), []
+
+    def down():
+        calls.append(1)
+        raise requests.ConnectionError("sin red")
+
+    with pytest.raises(UpstreamError): up.call("yahoo", down)
+    assert len(calls) == 2  # el breaker se abre tras 2 fallos y corta el tercer intento
+    assert up.status() == {'yahoo': 'open'}
@@ -0,0 +1,28 @@
+from valuation.upstream import UpstreamError
+from valuation.warmer import Warmer
+
+
+class _Task:
+    def __init__(self, name, fail=False):
+        self.__name__, self.fail, self.warmed = name, fail, []
+
+    def warm(self, ticker, within=None, **kwargs):
+        if self.fail: raise UpstreamError("Sin respuesta de Finviz")
+        self.warmed.append(ticker)
+
+
+def test_a_failing_task_does_not_skip_the_rest():
+    growth, ratios, weiss = _Task("get_growth_estimate", fail=True), _Task("calculate_robust_ratios"), _Task("get_weiss_data")
+    warmer = Warmer(["AAA", "BBB"], tasks=[(growth, {}), (ratios, {}), (weiss, {})], within=60)
+    errors = warmer.run_once()
+    assert sorted(ratios.warmed) == ["AAA", "BBB"]
+    assert sorted(weiss.warmed) == ["AAA", "BBB"]
+    assert errors == {t: ["get_growth_estimate: Sin respuesta de Finviz"] for t in ("AAA", "BBB")}
+
+
+def test_default_tasks_warm_both_ratio_history_views(monkeypatch):
+    monkeypatch.setenv("VALOR_CACHE_URL", "memory://")
+    from valuation.ratios import ROLLING_WINDOW
+    from valuation.warmer import default_tasks
+    windows = [kwargs.get('window') for fn, kwargs in default_tasks(10) if fn.__name__ == 'get_ratio_history']
+    assert windows == [None, ROLLING_WINDOW]  # el selector de la app: toda la historia y la ventana móvil
@@ -0,0 +1,3 @@
+"""
+Núcleo de datos y valoración de Valuación Master Pro (sin dependencias de UI).
+"""
@@ -0,0 +1,91 @@
+"""
+Análisis completo de un ticker, sin UI: lo usan la app de Streamlit y la CLI.
+"""
+import math
+import time
+
+from valuation import dcf, metrics, montecarlo, projection, weiss
+from valuation.ratios import latest_fundamentals, robust_ratios
+from valuation.records import AnalysisRecord
+from valuation.upstream import UpstreamError
+
+DEFAULT_GROWTH = 10.0
+
+
+@metrics.timer("analysis.full")
+def full_analysis(market, ticker, years_hist=10, ratios=None, growth=None):
+    """
+    AnalysisRecord con los datos base de la página de un ticker, o None si Yahoo no da precio.
+    `ratios(ticker, years)` y `growth(ticker) -> (%, fuente)` permiten inyectar versiones cacheadas;
+    sin `growth` no se consulta ninguna fuente externa de crecimiento.
+    Lanza UpstreamError si Yahoo no responde y no hay datos guardados; un fallo de las
+    fuentes de crecimiento solo deja el crecimiento vacío.
+    """
+    info = market.info(ticker)
+    price = info.get('currentPrice') or info.get('regularMarketPrice')
+    if not price: return None
+
+    hist_ratios = ratios(ticker, years_hist) if ratios else robust_ratios(market, ticker, years_hist)
+
+    # Historial de dividendos (Weiss necesita saber si existe)
+    div_history = market.dividends(ticker, years_hist)
+
+    try: finviz_g, growth_source = growth(ticker) if growth else (None, None)
+    except UpstreamError: finviz_g, growth_source = None, None
+
+    latest = latest_fundamentals(market, ticker)
+    # Fecha de los datos, no del cálculo: si Yahoo cae, el almacén sirve lo último guardado.
+    fetched = [t for t in (market.fetched_at(ticker, 'info'), market.fetched_at(ticker, 'prices')) if t is not None]
+
+    return AnalysisRecord.build(ticker, info, hist_ratios, div_history, finviz_g, growth_source,
+                                as_of=min(fetched, default=time.time()), fcf_per_share=dcf.fcf_per_share(latest), fundamentals=latest)
+
+
+def weiss_summary(market, ticker, years=10):
+    """Rentabilidades de referencia Weiss (%), o None si no hay dividendos suficientes."""
+    bands = weiss.weiss_bands(market.history(ticker, years, interval="1d")['Close'], market.dividends(ticker, years))
+    if bands is None: return None
+    return {k: bands[k] for k in ('buy_yield', 'neutral_yield', 'sell_yield')}
+
+
+def valuation_report(analysis, growth=None, exit_pe=None, weiss_yields=None):
+    """
+    Resumen plano de la valoración (lo que la app muestra en cabecera, calculadora y escenarios).
+    Por defecto: crecimiento estimado (o 10%) y PER de salida = PER histórico.
+    El DCF usa el mismo crecimiento en su primera etapa y los supuestos por defecto de valuation.dcf.
+    """
+    price, pe_mean, eps = analysis.price, analysis.pe_mean, analysis.eps
+    growth = growth if growth is not None else (analysis.growth or DEFAULT_GROWTH)
+    exit_pe = exit_pe if exit_pe is not None else pe_mean
+
+    fair = float(projection.fair_value(eps, pe_mean))
+    margin = float(projection.margin(price, fair))
+    f_price = float(projection.project_price(eps, growth, exit_pe))
+    cagr = projection.cagr(f_price, price)
+    sim = montecarlo.simulate(eps, price, growth, montecarlo.default_growth_sd(growth),
+                              *montecarlo.pe_bounds(analysis.ratios, exit_pe))
+
+    report = {
+        'ticker': analysis.ticker, 'name': analysis.name,
+        'sector': analysis.sector, 'price': price, 'eps': eps, 'pe_hist': pe_mean,
+        'fair_value': fair, 'margin_pct': margin, 'verdict': projection.VERDICTS[projection.verdict(margin)],
+        'growth_pct': float(growth), 'growth_source': analysis.growth_source, 'exit_pe': float(exit_pe),
+        'price_5y': f_price, 'cagr_pct': cagr if math.isfinite(cagr) else None,
+        'warnings': [w['msg'] for w in projection.validate_projection(growth, exit_pe, cagr, price)],
+        'dividend_yield_pct': analysis.dividend_yield * 100,
+        'ratios': analysis.ratios,
+    }
+    for q in montecarlo.PERCENTILES:
+        report[f'mc_price_p{q}'] = sim['price'][q]
+        report[f'mc_cagr_p{q}'] = sim['cagr'][q]
+    # DCF solo con FCF positivo (como la app y el screener); sin solución dentro del rango -> None.
+    fcf, dcf_fields = analysis.fcf_per_share, dict.fromkeys(('dcf_value', 'dcf_margin_pct', 'implied_growth_pct', 'implied_discount_pct'))
+    if fcf is not None and fcf > 0:
+        value = dcf.dcf_value(fcf, growth)
+        dcf_fields.update(dcf_value=value, dcf_margin_pct=float(projection.margin(price, value)),
+                          implied_growth_pct=dcf.implied_growth(price, fcf),
+                          implied_discount_pct=dcf.implied_discount(price, fcf, growth))
+    report.update({k: v if v is not None and math.isfinite(v) else None for k, v in dcf_fields.items()})
+    if weiss_yields:
+        report.update({f'weiss_{k}': v for k, v in weiss_yields.items()})
+    return report
@@ -0,0 +1,370 @@
+"""
+Caché compartida entre procesos y réplicas, con single-flight.
+
+Sustituye a la caché por proceso de Streamlit en las funciones caras (análisis completo,
+ratios, crecimiento): la primera sesión que pide un ticker lo calcula y el resto de
+procesos lo leen. Mientras se calcula, las demás peticiones de la misma clave esperan
+al resultado en vez de lanzar su propia descarga.
+
+Con `stale_ttl`, una entrada caducada se sigue sirviendo al instante durante ese margen
+(stale-while-revalidate) mientras un hilo de fondo la recalcula; si el recálculo falla
+se sigue sirviendo la última buena.
+
+Delante del backend hay un nivel en memoria (LRU con presupuesto en bytes,
+VALOR_CACHE_MB) que evita deserializar en cada rerun lo que aún está fresco.
+
+Backends (VALOR_CACHE_URL):
+    sqlite:///ruta.sqlite   (por defecto .cache/shared.sqlite) - procesos de una misma máquina
+    redis://host:6379/0     cualquier servidor compatible con Redis (requiere `redis`)
+    memory://               solo en proceso (pruebas, o sustituto local de Redis)
+"""
+import hashlib
+import inspect
+import os
+import pickle
+import sqlite3
+import sys
+import threading
+import time
+import uuid
+from collections import OrderedDict, defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import closing, contextmanager
+from dataclasses import fields, is_dataclass
+from functools import wraps
+
+import numpy as np
+import pandas as pd
+
+from valuation import metrics
+
+DEFAULT_URL = os.environ.get("VALOR_CACHE_URL", "sqlite:///" + os.path.join(".cache", "shared.sqlite"))
+LOCK_TIMEOUT = 60   # s que puede durar un cálculo antes de que otro proceso lo dé por muerto
+POLL = 0.05         # s entre comprobaciones mientras otro proceso calcula
+LOCAL_MB = float(os.environ.get("VALOR_CACHE_MB", "64"))  # nivel en memoria delante del backend
+
+_refresher = ThreadPoolExecutor(max_workers=4, thread_name_prefix="revalidate")
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS entries (key TEXT PRIMARY KEY, expires REAL, payload BLOB) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS locks (key TEXT PRIMARY KEY, owner TEXT, expires REAL) WITHOUT ROWID;
+"""
+
+
+def approx_bytes(value):
+    """Tamaño aproximado en memoria de un valor cacheado (arrays, pandas, contenedores, dataclasses)."""
+    if hasattr(value, 'nbytes') and callable(value.nbytes): return value.nbytes()
+    if isinstance(value, np.ndarray): return max(sys.getsizeof(value), value.nbytes)
+    if isinstance(value, (pd.DataFrame, pd.Series, pd.Index)):
+        usage = value.memory_usage(deep=True)
+        return int(usage.sum() if isinstance(usage, pd.Series) else usage)
+    if is_dataclass(value) and not isinstance(value, type):
+        return sys.getsizeof(value) + sum(approx_bytes(getattr(value, f.name)) for f in fields(value))
+    if isinstance(value, dict):
+        return sys.getsizeof(value) + sum(approx_bytes(k) + approx_bytes(v) for k, v in value.items())
+    if isinstance(value, (list, tuple, set, frozenset)):
+        return sys.getsizeof(value) + sum(approx_bytes(v) for v in value)
+    return sys.getsizeof(value)
+
+
+class LRUCache:
+    """
+    Diccionario LRU con presupuesto en bytes: al superarlo se desalojan las entradas
+    menos usadas. Con `name` informa de su uso de memoria en el registro de métricas.
+    """
+
+    def __init__(self, max_bytes, name=None, sizeof=approx_bytes):
+        self.max_bytes, self.sizeof = int(max_bytes), sizeof
+        self._data = OrderedDict()  # clave -> (valor, bytes)
+        self._lock = threading.Lock()
+        self.bytes = self.evictions = 0
+        if name: metrics.registry.track_memory(name, self)
+
+    def get(self, key, default=None):
+        with self._lock:
+            item = self._data.get(key)
+            if item is None: return default
+            self._data.move_to_end(key)
+            return item[0]
+
+    def set(self, key, value, size=None):
+        size = self.sizeof(value) if size is None else size
+        with self._lock:
+            old = self._data.pop(key, None)
+            if old: self.bytes -= old[1]
+            if size > self.max_bytes: return  # no cabe ni sola: no se guarda
+            self._data[key] = (value, size)
+            self.bytes += size
+            while self.bytes > self.max_bytes:
+                _, (_, evicted) = self._data.popitem(last=False)
+                self.bytes -= evicted
+                self.evictions += 1
+
+    def pop(self, key, default=None):
+        with self._lock:
+            item = self._data.pop(key, None)
+            if item is None: return default
+            self.bytes -= item[1]
+            return item[0]
+
+    def keys(self):
+        with self._lock: return list(self._data)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+            self.bytes = 0
+
+    def __len__(self):
+        return len(self._data)
+
+    def __contains__(self, key):
+        return key in self._data
+
+    def stats(self):
+        with self._lock:
+            return {'entries': len(self._data), 'bytes': self.bytes, 'max_bytes': self.max_bytes, 'evictions': self.evictions}
+
+
+class MemoryBackend:
+    """Backend en proceso (LRU acotado en bytes) con la misma interfaz que los compartidos."""
+
+    def __init__(self, max_bytes=256 * 2**20):
+        self._data = LRUCache(max_bytes, name="backend.memory", sizeof=lambda entry: len(entry[1]) + 64)
+        self._locks = {}
+        self._guard = threading.Lock()
+
+    def get(self, key):
+        return self._data.get(key)
+
+    def set(self, key, payload, ttl):
+        self._data.set(key, (time.time() + ttl, payload))
+
+    def delete(self, key):
+        self._data.pop(key)
+
+    def acquire(self, key, owner, timeout):
+        with self._guard:
+            held = self._locks.get(key)
+            if held and held[1] > time.time(): return False
+            self._locks[key] = (owner, time.time() + timeout)
+            return True
+
+    def release(self, key, owner):
+        with self._guard:
+            if self._locks.get(key, (None,))[0] == owner: del self._locks[key]
+
+
+class SQLiteBackend:
+    """Fichero SQLite (WAL) compartido por todos los procesos de la máquina."""
+
+    def __init__(self, path):
+        self.path = path
+        if os.path.dirname(path): os.makedirs(os.path.dirname(path), exist_ok=True)
+        with self._db() as con: con.executescript(_SCHEMA)
+
+    @contextmanager
+    def _db(self):
+        with closing(sqlite3.connect(self.path, timeout=30)) as con:
+            con.execute("PRAGMA journal_mode=WAL")
+            with con: yield con
+
+    def get(self, key):
+        with self._db() as con:
+            row = con.execute("SELECT expires, payload FROM entries WHERE key=?", (key,)).fetchone()
+        return (row[0], row[1]) if row else None
+
+    def set(self, key, payload, ttl):
+        with self._db() as con:
+            con.execute("INSERT OR REPLACE INTO entries VALUES (?, ?, ?)", (key, time.time() + ttl, payload))
+
+    def delete(self, key):
+        with self._db() as con: con.execute("DELETE FROM entries WHERE key=?", (key,))
+
+    def acquire(self, key, owner, timeout):
+        with self._db() as con:
+            con.execute("DELETE FROM locks WHERE key=? AND expires<?", (key, time.time()))
+            cur = con.execute("INSERT OR IGNORE INTO locks VALUES (?, ?, ?)", (key, owner, time.time() + timeout))
+            return cur.rowcount == 1
+
+    def release(self, key, owner):
+        with self._db() as con: con.execute("DELETE FROM locks WHERE key=? AND owner=?", (key, owner))
+
+
+class RedisBackend:
+    """
+    Servidor compatible con Redis. `client` permite inyectar cualquier objeto con la API
+    de redis-py (get/set/delete/eval), p. ej. un sustituto local.
+    """
+
+    _RELEASE = "if redis.call('get', KEYS[1]) == ARGV[1] then return redis.call('del', KEYS[1]) end return 0"
+
+    def __init__(self, url=None, client=None):
+        if client is None:
+            import redis
+            client = redis.Redis.from_url(url)
+        self.client = client
+
+    def get(self, key):
+        payload = self.client.get("valor:" + key)
+        return (float("inf"), payload) if payload is not None else None  # Redis expira por sí mismo
+
+    def set(self, key, payload, ttl):
+        self.client.set("valor:" + key, payload, ex=max(int(ttl), 1))
+
+    def delete(self, key):
+        self.client.delete("valor:" + key)
+
+    def acquire(self, key, owner, timeout):
+        return bool(self.client.set("valor:lock:" + key, owner, nx=True, ex=max(int(timeout), 1)))
+
+    def release(self, key, owner):
+        self.client.eval(self._RELEASE, 1, "valor:lock:" + key, owner)
+
+
+def backend_from_url(url=DEFAULT_URL):
+    if url.startswith("memory://"): return MemoryBackend()
+    if url.startswith(("redis://", "rediss://", "unix://")): return RedisBackend(url)
+    if url.startswith("sqlite:///"): return SQLiteBackend(url[len("sqlite:///"):])
+    raise ValueError(f"URL de caché no soportada: {url}")
+
+
+class SharedCache:
+    """
+    Memoización con TTL sobre un backend compartido. Los valores se serializan con pickle,
+    así que el backend debe ser de confianza (solo lo escribe esta app).
+    """
+
+    def __init__(self, backend=None, lock_timeout=LOCK_TIMEOUT, poll=POLL, local_bytes=LOCAL_MB * 2**20):
+        self.backend = backend or backend_from_url()
+        self.lock_timeout, self.poll = lock_timeout, poll
+        self.local = LRUCache(local_bytes, name="shared.local") if local_bytes else None
+        self._local_locks = defaultdict(threading.Lock)
+        self._guard = threading.Lock()
+        self._refreshing = set()
+
+    @staticmethod
+    def key(name, args, kwargs):
+        return name + ":" + hashlib.sha1(repr((args, sorted(kwargs.items()))).encode()).hexdigest()
+
+    def _lookup(self, key, within=0):
+        """
+        ('hit' | 'stale' | 'expiry' | 'miss', valor). El payload guarda su propio fin de frescura;
+        con `within` cuenta como obsoleto lo que caduca en menos de esos segundos.
+        """
+        local = self.local.get(key) if self.local is not None else None
+        if local is not None and local[0] - within > time.time(): return 'hit', local[1]
+        entry = self.backend.get(key)
+        if entry is None: return 'miss', None
+        expires, payload = entry
+        if expires <= time.time(): return 'expiry', None
+        fresh_until, value = pickle.loads(payload)
+        if fresh_until - within > time.time():
+            self._keep_local(key, fresh_until, value)
+            return 'hit', value
+        return 'stale', value
+
+    def _keep_local(self, key, fresh_until, value):
+        # Solo lo fresco: lo caducado siempre se vuelve a mirar en el backend compartido.
+        if self.local is not None: self.local.set(key, (fresh_until, value))
+
+    def _store(self, key, value, ttl, stale_ttl):
+        if callable(ttl): ttl = ttl(value)
+        fresh_until = time.time() + ttl
+        self.backend.set(key, pickle.dumps((fresh_until, value), protocol=pickle.HIGHEST_PROTOCOL), ttl + stale_ttl)
+        self._keep_local(key, fresh_until, value)
+
+    def _revalidate(self, name, key, compute, ttl, stale_ttl):
+        """Recalcula en segundo plano si nadie (en ningún proceso) lo está haciendo ya."""
+        with self._guard:
+            if key in self._refreshing: return
+            self._refreshing.add(key)
+
+        def run():
+            owner = uuid.uuid4().hex
+            try:
+                if not self.backend.acquire(key, owner, self.lock_timeout): return
+                try:
+                    if self._lookup(key)[0] == 'hit': return
+                    with metrics.timed(name): value = compute()
+                    self._store(key, value, ttl, stale_ttl)
+                except Exception:
+                    pass  # se sigue sirviendo el dato anterior; se reintentará en la próxima lectura
+                finally:
+                    self.backend.release(key, owner)
+            finally:
+                with self._guard: self._refreshing.discard(key)
+
+        _refresher.submit(run)
+
+    def get_or_compute(self, name, key, compute, ttl, stale_ttl=0, warm=None):
+        """
+        `warm` (s): modo precalentamiento; recalcula ya, en primer plano, si la entrada
+        caduca antes de ese margen, para que los usuarios nunca la encuentren caducada.
+        """
+        status, value = self._lookup(key, warm or 0)
+        if status == 'hit':
+            metrics.cache_event(name, 'hit')
+            return value
+        if status == 'stale' and warm is None:
+            metrics.cache_event(name, 'stale')
+            self._revalidate(name, key, compute, ttl, stale_ttl)
+            return value
+        # Single-flight: un hilo por proceso y un proceso en todo el backend calculan la clave.
+        with self._guard: local = self._local_locks[key]
+        with local:
+            owner, waited = uuid.uuid4().hex, 0.0
+            while True:
+                status, value = self._lookup(key, warm or 0)
+                if status == 'hit' or (status == 'stale' and warm is None):
+                    metrics.cache_event(name, status)
+                    return value
+                if self.backend.acquire(key, owner, self.lock_timeout): break
+                if waited >= self.lock_timeout: break  # el otro proceso no termina: calcular igualmente
+                time.sleep(self.poll)
+                waited += self.poll
+            try:
+                # Quien tenía el lock pudo guardar la clave entre nuestra lectura y el acquire.
+                status, value = self._lookup(key, warm or 0)
+                if status == 'hit':
+                    metrics.cache_event(name, 'hit')
+                    return value
+                metrics.cache_event(name, status)
+                with metrics.timed(name): value = compute()
+                self._store(key, value, ttl, stale_ttl)
+                return value
+            finally:
+                self.backend.release(key, owner)
+
+    def memoize(self, ttl, stale_ttl=0, name=None, version=None):
+        """
+        Decorador: `@shared.memoize(ttl=3600, stale_ttl=86400)`. La clave se construye con los
+        argumentos normalizados (f("A") y f("A", years=10) comparten entrada) y `version`
+        (cambiarla al cambiar la forma del valor invalida lo guardado). `ttl` puede ser una
+        función del valor calculado. El wrapper expone `.clear(*args)` y `.warm(*args, within=s)`.
+        """
+        def deco(fn):
+            label, sig = name or fn.__name__, inspect.signature(fn)
+            prefix = label if version is None else f"{label}@v{version}"
+
+            def key(args, kwargs):
+                bound = sig.bind(*args, **kwargs)
+                bound.apply_defaults()
+                return self.key(prefix, (), bound.arguments)
+
+            @wraps(fn)
+            def wrapper(*args, **kwargs):
+                return self.get_or_compute(label, key(args, kwargs), lambda: fn(*args, **kwargs), ttl, stale_ttl)
+
+            def warm(*args, within=0, **kwargs):
+                return self.get_or_compute(label, key(args, kwargs), lambda: fn(*args, **kwargs), ttl, stale_ttl, warm=within)
+
+            def clear(*args, **kwargs):
+                k = key(args, kwargs)
+                if self.local is not None: self.local.pop(k)
+                self.backend.delete(k)
+
+            wrapper.clear = clear
+            wrapper.warm = warm
+            return wrapper
+        return deco
@@ -0,0 +1,111 @@
+"""
+CLI de valoración sin Streamlit (uno o varios tickers, salida JSON/CSV/tabla).
+
+    python -m valuation AAPL MSFT
+    python -m valuation --file universo.csv --format csv --out valoracion.csv
+
+Las dependencias pesadas se importan solo al usarse: yfinance únicamente si el
+almacén local no tiene datos frescos, y requests solo con --fetch-growth.
+"""
+import argparse
+import csv
+import json
+import sys
+
+TABLE_COLUMNS = ('ticker', 'price', 'fair_value', 'margin_pct', 'verdict', 'price_5y', 'cagr_pct', 'mc_cagr_p50')
+
+
+def build_parser():
+    from valuation.store import DEFAULT_PATH, DEFAULT_TTL
+    p = argparse.ArgumentParser(prog="python -m valuation", description="Valoración intrínseca de acciones (sin UI).")
+    p.add_argument("tickers", nargs="*", help="Tickers a valorar")
+    p.add_argument("--file", help="CSV (columna 'ticker', opcional 'growth') o texto con tickers")
+    p.add_argument("--format", choices=("json", "csv", "table"), default="table")
+    p.add_argument("--out", help="Fichero de salida (por defecto stdout)")
+    p.add_argument("--years", type=int, default=10, help="Años de media histórica (5-10)")
+    p.add_argument("--growth", type=float, help="Crecimiento (5y) %% para todos los tickers")
+    p.add_argument("--exit-pe", type=float, help="PER de salida común (por defecto el histórico de cada ticker)")
+    p.add_argument("--fetch-growth", action="store_true", help="Consultar Finviz/StockAnalysis si no se da --growth")
+    p.add_argument("--store", default=DEFAULT_PATH, help="Ruta del almacén SQLite")
+    p.add_argument("--ttl", type=float, default=DEFAULT_TTL, help="Antigüedad máxima (s) de los datos del almacén")
+    p.add_argument("--workers", type=int, default=8, help="Tickers en paralelo")
+    return p
+
+
+def _read_tickers(args):
+    from valuation import screener
+    tickers, growth = [t.upper() for t in args.tickers], {}
+    if args.file:
+        if args.file.lower().endswith(".csv"):
+            import pandas as pd
+            from_file, growth = screener.tickers_from_csv(pd.read_csv(args.file))
+            growth = growth or {}
+        else:
+            with open(args.file) as f: from_file = screener.parse_tickers(f.read())
+        tickers += from_file
+    return list(dict.fromkeys(tickers)), growth
+
+
+def _flatten(report):
+    row = {k: v for k, v in report.items() if k not in ('ratios', 'warnings')}
+    for name, stats in (report.get('ratios') or {}).items():
+        for stat, value in stats.items(): row[f"{name} {stat}"] = value
+    row['warnings'] = " | ".join(report.get('warnings') or [])
+    return row
+
+
+def write_reports(reports, fmt, out):
+    if fmt == "json":
+        json.dump(reports, out, indent=2, ensure_ascii=False, default=float, allow_nan=False)  # NaN no es JSON válido
+        out.write("\n")
+    elif fmt == "csv":
+        rows = [_flatten(r) for r in reports]
+        fields = list(dict.fromkeys(k for r in rows for k in r))
+        writer = csv.DictWriter(out, fieldnames=fields)
+        writer.writeheader()
+        writer.writerows(rows)
+    else:
+        out.write("  ".join(f"{c:>12}" for c in TABLE_COLUMNS) + "\n")
+        for r in reports:
+            if 'error' in r:
+                out.write(f"{r['ticker']:>12}  ERROR: {r['error']}\n")
+                continue
+            cells = [f"{r[c]:>12.2f}" if isinstance(r[c], float) else f"{str(r[c]):>12}" for c in TABLE_COLUMNS]
+            out.write("  ".join(cells) + "\n")
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    tickers, growth_map = _read_tickers(args)
+    if not tickers:
+        build_parser().error("indica al menos un ticker o --file")
+
+    from concurrent.futures import ThreadPoolExecutor
+    from valuation.analysis import full_analysis, valuation_report, weiss_summary
+    from valuation.data import MarketData
+    from valuation.store import MarketStore
+
+    market = MarketData(MarketStore(path=args.store, ttl=args.ttl), ttl=args.ttl)
+    growth_fn = None
+    if args.fetch_growth and args.growth is None:
+        from valuation.growth import GrowthEstimator
+        growth_fn = GrowthEstimator().estimate
+
+    def run(ticker):
+        try:
+            analysis = full_analysis(market, ticker, args.years, growth=growth_fn)
+            if analysis is None: return {'ticker': ticker, 'error': "No se encontró el ticker o faltan datos"}
+            weiss_yields = weiss_summary(market, ticker, args.years) if analysis.dividend_rate else None
+            growth = args.growth if args.growth is not None else growth_map.get(ticker)
+            return valuation_report(analysis, growth, args.exit_pe, weiss_yields)
+        except Exception as e:
+            return {'ticker': ticker, 'error': str(e)}
+
+    with ThreadPoolExecutor(max_workers=max(args.workers, 1)) as pool:
+        reports = list(pool.map(run, tickers))
+
+    if args.out:
+        with open(args.out, "w", newline="") as f: write_reports(reports, args.format, f)
+    else:
+        write_reports(reports, args.format, sys.stdout)
+    return 1 if all('error' in r for r in reports) else 0
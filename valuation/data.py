@@ -0,0 +1,78 @@
+"""
+Capa única de adquisición de datos.
+
+Toda la app (ratios, proyección, Weiss) lee de aquí: info, histórico mensual,
+histórico diario, estados financieros, balances y dividendos. Cada dataset se
+descarga una sola vez (vía MarketStore) y se mantiene en memoria durante `ttl`,
+dentro de un presupuesto de bytes (VALOR_MARKET_MB) con desalojo LRU.
+"""
+import os
+import threading
+import time
+
+import pandas as pd
+
+from valuation import metrics
+from valuation.cache import LRUCache, approx_bytes
+from valuation.store import DEFAULT_TTL, MarketStore
+
+MEMO_MB = float(os.environ.get("VALOR_MARKET_MB", "256"))
+
+
+class MarketData:
+
+    def __init__(self, store=None, ttl=DEFAULT_TTL, max_bytes=MEMO_MB * 2**20):
+        self.store = store or MarketStore(ttl=ttl)
+        self.ttl = ttl
+        self._memo = LRUCache(max_bytes, name="market.memo", sizeof=lambda entry: approx_bytes(entry[1]))
+        self._memo_lock = threading.Lock()
+        self._key_locks = {}
+
+    def _get(self, key, loader):
+        """Memo en proceso con TTL; un lock por clave evita descargas duplicadas concurrentes."""
+        name = f"market.{key[0]}"
+        with self._memo_lock:
+            hit = self._memo.get(key)
+            if hit and hit[0] > time.monotonic():
+                metrics.cache_event(name, 'hit')
+                return _shallow(hit[1])
+            lock = self._key_locks.setdefault(key, threading.Lock())
+        with lock:
+            with self._memo_lock: hit = self._memo.get(key)
+            if hit and hit[0] > time.monotonic():
+                metrics.cache_event(name, 'hit')
+                return _shallow(hit[1])
+            metrics.cache_event(name, 'expiry' if hit else 'miss')
+            value = loader()
+            with self._memo_lock: self._memo.set(key, (time.monotonic() + self.ttl, value))
+        return _shallow(value)
+
+    def info(self, ticker):
+        return self._get(('info', ticker), lambda: self.store.info(ticker))
+
+    def history(self, ticker, years=10, interval="1mo"):
+        return self._get(('history', ticker, years, interval), lambda: self.store.history(ticker, years, interval))
+
+    def dividends(self, ticker, years=10):
+        return self._get(('dividends', ticker, years), lambda: self.store.dividends(ticker, years))
+
+    def statement(self, ticker, name):
+        return self._get(('statement', ticker, name), lambda: self.store.statement(ticker, name))
+
+    def fetched_at(self, ticker, dataset):
+        """Sin memo: la antigüedad real de lo que sirve el almacén (ver MarketStore.fetched_at)."""
+        return self.store.fetched_at(ticker, dataset)
+
+    def prefetch(self, tickers, years=10):
+        """Precarga de precios en bloque para un universo (ver MarketStore.prefetch)."""
+        self.store.prefetch(tickers, years)
+
+    def invalidate(self, ticker=None):
+        with self._memo_lock:
+            for key in [k for k in self._memo.keys() if ticker is None or k[1] == ticker]: self._memo.pop(key)
+
+
+def _shallow(value):
+    # Copia superficial: el llamador puede reasignar índices sin alterar la caché.
+    if isinstance(value, (pd.DataFrame, pd.Series)): return value.copy(deep=False)
+    return dict(value) if isinstance(value, dict) else value
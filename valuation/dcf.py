@@ -0,0 +1,95 @@
+"""
+DCF en tres etapas y DCF inverso (expectativas implícitas en el precio), vectorizados.
+
+Etapas sobre el FCF por acción:
+    1. crecimiento alto constante durante `high_years`;
+    2. transición: el crecimiento converge linealmente al terminal en `fade_years`;
+    3. valor terminal de Gordon sobre el último flujo explícito.
+Crecimientos y tasas van en % (como en projection) y todas las funciones aceptan escalares
+o arrays con broadcasting: un universo de 1.000 tickers se valora o se resuelve en una llamada.
+"""
+import numpy as np
+
+HIGH_YEARS = 5
+FADE_YEARS = 5
+DISCOUNT_RATE = 9.0      # % anual (coste del capital propio)
+TERMINAL_GROWTH = 2.5    # % anual a perpetuidad
+GROWTH_RANGE = (-50.0, 100.0)   # intervalo de búsqueda del crecimiento implícito
+MAX_DISCOUNT = 50.0
+TOL = 1e-8               # error relativo sobre el precio
+MAX_ITER = 100
+
+
+def fcf_per_share(latest):
+    """FCF TTM por acción a partir de ratios.latest_fundamentals, o None si falta algún dato."""
+    fcf, shares = latest.get('fcf'), latest.get('shares')
+    if fcf is None or not shares or shares <= 0: return None
+    return fcf / shares
+
+
+def growth_path(growth, terminal_growth=TERMINAL_GROWTH, high_years=HIGH_YEARS, fade_years=FADE_YEARS):
+    """Crecimiento (fracción) de cada año explícito, con forma (..., high_years + fade_years)."""
+    g = np.asarray(growth, dtype=float)[..., None] / 100
+    gt = np.asarray(terminal_growth, dtype=float)[..., None] / 100
+    fade = np.concatenate([np.zeros(high_years), np.arange(1, fade_years + 1) / max(fade_years, 1)])
+    return g + (gt - g) * fade
+
+
+def dcf_value(fcf, growth, discount=DISCOUNT_RATE, terminal_growth=TERMINAL_GROWTH,
+              high_years=HIGH_YEARS, fade_years=FADE_YEARS):
+    """Valor por acción: flujos explícitos + terminal, descontados. NaN donde descuento <= terminal."""
+    fcf, r, gt = (np.asarray(x, dtype=float) for x in (fcf, discount, terminal_growth))
+    path = growth_path(growth, gt, high_years, fade_years)
+    flows = fcf[..., None] * np.cumprod(1 + path, axis=-1)
+    factors = (1 + r[..., None] / 100) ** -np.arange(1, path.shape[-1] + 1)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        terminal = flows[..., -1] * (1 + gt / 100) / ((r - gt) / 100)
+        value = (flows * factors).sum(axis=-1) + terminal * factors[..., -1]
+    value = np.where(r > gt, value, np.nan)
+    return value if value.ndim else float(value)
+
+
+def _solve(f, target, lo, hi, tol=TOL, max_iter=MAX_ITER):
+    """
+    x tal que f(x) = target, con f creciente en [lo, hi], elemento a elemento.
+    Newton (derivada por diferencia finita) protegido por el intervalo: si el paso se sale
+    del intervalo se bisecciona. NaN donde el objetivo no está entre f(lo) y f(hi).
+    """
+    target = np.asarray(target, dtype=float)
+    lo, hi = np.broadcast_to(lo, target.shape).astype(float), np.broadcast_to(hi, target.shape).astype(float)
+    valid = np.isfinite(target) & (f(lo) <= target) & (target <= f(hi))
+    x = (lo + hi) / 2
+    for _ in range(max_iter):
+        err = f(x) - target
+        done = ~valid | (np.abs(err) <= tol * np.abs(target)) | (hi - lo <= tol)
+        if done.all(): break
+        lo, hi = np.where(err < 0, x, lo), np.where(err > 0, x, hi)
+        h = 1e-6 * np.maximum(np.abs(x), 1.0)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            step = x - err * h / (f(x + h) - (err + target))
+        newton = np.isfinite(step) & (step > lo) & (step < hi)
+        x = np.where(done, x, np.where(newton, step, (lo + hi) / 2))
+    return np.where(valid, x, np.nan)
+
+
+def _args(*arrays):
+    return np.broadcast_arrays(*(np.asarray(a, dtype=float) for a in arrays))
+
+
+def implied_growth(price, fcf, discount=DISCOUNT_RATE, terminal_growth=TERMINAL_GROWTH,
+                   high_years=HIGH_YEARS, fade_years=FADE_YEARS, bounds=GROWTH_RANGE):
+    """Crecimiento (%) de la primera etapa que iguala el DCF al precio. NaN si FCF <= 0."""
+    price, fcf, r, gt = _args(price, fcf, discount, terminal_growth)
+    f = lambda g: dcf_value(fcf, g, r, gt, high_years, fade_years)
+    out = _solve(f, np.where((fcf > 0) & (price > 0), price, np.nan), *bounds)
+    return out if out.ndim else float(out)
+
+
+def implied_discount(price, fcf, growth, terminal_growth=TERMINAL_GROWTH,
+                     high_years=HIGH_YEARS, fade_years=FADE_YEARS, max_discount=MAX_DISCOUNT):
+    """Tasa de descuento (%) que iguala el DCF al precio (la rentabilidad esperada comprando hoy)."""
+    price, fcf, g, gt = _args(price, fcf, growth, terminal_growth)
+    # El valor decrece con el descuento: se resuelve sobre -valor para tener una función creciente.
+    f = lambda r: -dcf_value(fcf, g, r, gt, high_years, fade_years)
+    out = _solve(f, np.where((fcf > 0) & (price > 0), -price, np.nan), gt + 0.01, max_discount)
+    return out if out.ndim else float(out)
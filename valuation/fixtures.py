@@ -0,0 +1,96 @@
+"""
+Doble de yfinance que reproduce respuestas grabadas en disco (uso offline y pruebas).
+
+Estructura de un directorio de fixtures:
+    <root>/<TICKER>/history.csv      Histórico diario sin ajustar (con Dividends y Stock Splits)
+    <root>/<TICKER>/<estado>.csv     financials, quarterly_financials, balance_sheet, ...
+    <root>/<TICKER>/info.json        Diccionario `info`
+"""
+import json
+import os
+
+import pandas as pd
+
+STATEMENT_FILES = ('financials', 'quarterly_financials', 'balance_sheet', 'quarterly_balance_sheet',
+                   'cashflow', 'quarterly_cashflow')
+
+
+def record(ticker, root, period="10y"):
+    """Graba las respuestas reales de yfinance de un ticker en `root`."""
+    import yfinance as yf
+    stock = yf.Ticker(ticker)
+    folder = os.path.join(root, ticker.upper())
+    os.makedirs(folder, exist_ok=True)
+    hist = stock.history(period=period, interval="1d", auto_adjust=False, actions=True)
+    if hist.index.tz is not None: hist.index = hist.index.tz_localize(None)
+    hist.to_csv(os.path.join(folder, "history.csv"))
+    for name in STATEMENT_FILES:
+        getattr(stock, name).to_csv(os.path.join(folder, f"{name}.csv"))
+    with open(os.path.join(folder, "info.json"), "w") as f:
+        json.dump(stock.info, f, default=str)
+    return folder
+
+
+class RecordedTicker:
+    """
+    Imita la parte de `yf.Ticker` que usa la app. Los periodos relativos ("10y")
+    se cuentan desde la última sesión grabada, no desde hoy.
+    `calls` registra cada acceso que en yfinance supondría una petición de red.
+    """
+
+    def __init__(self, ticker, root):
+        self.ticker = ticker.upper()
+        self.folder = os.path.join(root, self.ticker)
+        self.calls = []
+
+    def _csv(self, name):
+        path = os.path.join(self.folder, f"{name}.csv")
+        if not os.path.exists(path): return pd.DataFrame()
+        return pd.read_csv(path, index_col=0)
+
+    def history(self, period=None, interval="1d", start=None, end=None, auto_adjust=True, actions=True, **kwargs):
+        self.calls.append(('history', period or start))
+        hist = self._csv("history")
+        if hist.empty: return hist
+        hist.index = pd.DatetimeIndex(pd.to_datetime(hist.index), name='Date')
+        if start is not None: hist = hist[hist.index >= pd.Timestamp(start)]
+        elif period and period != "max":
+            n, unit = int(period[:-1]), period[-1]
+            offset = pd.DateOffset(years=n) if unit == 'y' else pd.DateOffset(days=n)
+            hist = hist[hist.index >= hist.index[-1] - offset]
+        if end is not None: hist = hist[hist.index < pd.Timestamp(end)]
+        if auto_adjust and 'Adj Close' in hist.columns:
+            hist = hist.assign(Close=hist['Adj Close']).drop(columns='Adj Close')
+        if not actions: hist = hist.drop(columns=['Dividends', 'Stock Splits'], errors='ignore')
+        if interval == "1mo":
+            agg = {c: 'sum' if c in ('Dividends', 'Stock Splits', 'Volume') else 'last' for c in hist.columns}
+            hist = hist.resample('MS').agg(agg).dropna(subset=['Close'])
+        return hist
+
+    @property
+    def dividends(self):
+        self.calls.append(('dividends', None))
+        hist = self._csv("history")
+        if hist.empty or 'Dividends' not in hist.columns: return pd.Series(dtype=float, name='Dividends')
+        hist.index = pd.DatetimeIndex(pd.to_datetime(hist.index), name='Date')
+        return hist.loc[hist['Dividends'] > 0, 'Dividends']
+
+    def _statement(self, name):
+        self.calls.append((name, None))
+        df = self._csv(name)
+        if not df.empty: df.columns = pd.to_datetime(df.columns)
+        return df
+
+    financials = property(lambda self: self._statement('financials'))
+    quarterly_financials = property(lambda self: self._statement('quarterly_financials'))
+    balance_sheet = property(lambda self: self._statement('balance_sheet'))
+    quarterly_balance_sheet = property(lambda self: self._statement('quarterly_balance_sheet'))
+    cashflow = property(lambda self: self._statement('cashflow'))
+    quarterly_cashflow = property(lambda self: self._statement('quarterly_cashflow'))
+
+    @property
+    def info(self):
+        self.calls.append(('info', None))
+        path = os.path.join(self.folder, "info.json")
+        if not os.path.exists(path): return {}
+        with open(path) as f: return json.load(f)
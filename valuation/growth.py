@@ -0,0 +1,148 @@
+"""
+Estimaciones de crecimiento de EPS a 5 años (Finviz, StockAnalysis).
+
+Todos los proveedores se consultan a la vez sobre sesiones HTTP reutilizables y se
+devuelve la primera respuesta válida (o un consenso). Los resultados, también los
+negativos, se cachean por proveedor. El valor se extrae con una expresión regular
+dirigida sobre los bytes de la página, sin construir el DOM completo. Las peticiones
+pasan por el planificador de upstream.py; un fallo transitorio no se cachea.
+"""
+import os
+import re
+import statistics
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+from urllib.parse import urlparse
+
+from valuation import metrics
+from valuation.upstream import UpstreamError, scheduler
+
+HEADERS = {'User-Agent': 'Mozilla/5.0'}
+TIMEOUT = 5
+TTL = 3600
+NEGATIVE_TTL = 6 * 3600  # una página sin dato suele seguir sin él durante horas
+RETRIES = 1  # el scraping es accesorio: un reintento y a la siguiente fuente
+MODES = ('first', 'median', 'mean')
+
+_FINVIZ_RE = re.compile(rb'EPS next 5Y\s*(?:</[^>]+>\s*)*<td[^>]*>(.*?)</td>', re.S)
+_TAGS_RE = re.compile(rb'<[^>]+>')
+_STOCKANALYSIS_RE = re.compile(r'(\d+\.?\d*)%\s*(?:annual|avg|average|growth)', re.IGNORECASE)
+
+_sessions = {}
+_sessions_lock = threading.Lock()
+_executor = ThreadPoolExecutor(max_workers=16, thread_name_prefix="growth")
+
+
+def _session(host):
+    """Una sesión con pool de conexiones por host, compartida entre hilos."""
+    with _sessions_lock:
+        if host not in _sessions:
+            import requests
+            from requests.adapters import HTTPAdapter
+            s = requests.Session()
+            s.headers.update(HEADERS)
+            s.mount("http://", HTTPAdapter(pool_connections=4, pool_maxsize=32))
+            s.mount("https://", HTTPAdapter(pool_connections=4, pool_maxsize=32))
+            _sessions[host] = s
+        return _sessions[host]
+
+
+def parse_finviz(content):
+    m = _FINVIZ_RE.search(content)
+    if not m: return None
+    val = _TAGS_RE.sub(b'', m.group(1)).replace(b'%', b'').strip()
+    try: return float(val) if val not in (b'-', b'') else None
+    except ValueError: return None
+
+
+def parse_stockanalysis(content):
+    matches = _STOCKANALYSIS_RE.findall(content.decode('utf-8', 'ignore'))
+    return float(matches[0]) if matches else None
+
+
+class Provider:
+    """Fuente HTTP de crecimiento. `base_url` se puede apuntar a un servidor local de pruebas."""
+
+    def __init__(self, name, base_url, path, parser):
+        self.name, self.base_url, self.path, self.parser = name, base_url.rstrip('/'), path, parser
+        self.host = urlparse(self.base_url).netloc.removeprefix("www.")
+
+    def url(self, ticker):
+        return self.base_url + self.path.format(ticker=ticker, ticker_lower=ticker.lower())
+
+    def fetch(self, ticker, timeout=TIMEOUT, upstream=scheduler):
+        def get():
+            r = _session(self.base_url).get(self.url(ticker), timeout=timeout)
+            if r.status_code == 429 or r.status_code >= 500: r.raise_for_status()  # transitorio: reintentar
+            return r
+        r = upstream.call(self.host, get, retries=RETRIES)
+        return self.parser(r.content) if r.status_code == 200 else None
+
+
+def default_providers():
+    return [
+        Provider("Finviz", os.environ.get("FINVIZ_BASE_URL", "https://finviz.com"), "/quote.ashx?t={ticker}", parse_finviz),
+        Provider("StockAnalysis", os.environ.get("STOCKANALYSIS_BASE_URL", "https://stockanalysis.com"),
+                 "/stocks/{ticker_lower}/forecast/", parse_stockanalysis),
+    ]
+
+
+class GrowthEstimator:
+    """
+    mode='first'  -> primera respuesta válida (carrera entre proveedores).
+    mode='median'/'mean' -> consenso de todas las respuestas válidas dentro del timeout.
+    """
+
+    def __init__(self, providers=None, mode='first', timeout=TIMEOUT, ttl=TTL, negative_ttl=NEGATIVE_TTL, upstream=scheduler):
+        if mode not in MODES: raise ValueError(f"mode debe ser uno de {MODES}")
+        self.providers = providers if providers is not None else default_providers()
+        self.upstream = upstream
+        self.mode, self.timeout, self.ttl, self.negative_ttl = mode, timeout, ttl, negative_ttl
+        self._cache = {}
+        self._lock = threading.Lock()
+
+    def _cached(self, provider, ticker):
+        with self._lock: hit = self._cache.get((provider.name, ticker))
+        fresh = hit is not None and hit[0] > time.monotonic()
+        metrics.cache_event(f"growth.{provider.name}", 'hit' if fresh else 'expiry' if hit else 'miss')
+        return hit if fresh else None
+
+    def _query(self, provider, ticker):
+        hit = self._cached(provider, ticker)
+        if hit: return hit[1]
+        try:
+            with metrics.timed(f"growth.{provider.name}"): value = provider.fetch(ticker, self.timeout, self.upstream)
+        except UpstreamError: raise
+        except Exception: value = None
+        expiry = time.monotonic() + (self.ttl if value is not None else self.negative_ttl)
+        with self._lock: self._cache[(provider.name, ticker)] = (expiry, value)
+        return value
+
+    @metrics.timer("growth.estimate")
+    def estimate(self, ticker):
+        """
+        Devuelve (crecimiento %, fuente) o (None, None) si ninguna fuente tiene el dato.
+        Lanza UpstreamError si no hay dato porque alguna fuente falló o no respondió a tiempo.
+        """
+        futures = {_executor.submit(self._query, p, ticker): p for p in self.providers}
+        results, pending, failed = {}, set(futures), []
+        deadline = time.monotonic() + self.timeout + 1
+        while pending:
+            done, pending = wait(pending, timeout=max(deadline - time.monotonic(), 0), return_when=FIRST_COMPLETED)
+            if not done: break
+            for f in done:
+                if f.exception() is not None:
+                    failed.append(futures[f].name)
+                    continue
+                value = f.result()
+                if value is None: continue
+                if self.mode == 'first': return value, futures[f].name
+                results[futures[f].name] = value
+        if not results:
+            failed += [futures[f].name for f in pending]
+            if failed: raise UpstreamError("Sin respuesta de " + ", ".join(failed))
+            return None, None
+        agg = statistics.median if self.mode == 'median' else statistics.fmean
+        return float(agg(results.values())), "Consenso (" + ", ".join(results) + ")"
@@ -0,0 +1,157 @@
+"""
+Instrumentación: tiempos por etapa y contadores de caché por función.
+
+    with metrics.timed("fetch.info"): ...
+    metrics.cache_event("get_full_analysis", "hit")
+
+Se exporta como JSON lines y en formato de texto de Prometheus (histogramas, para
+poder calcular p50/p95 agregando réplicas). VALOR_METRICS_LOG añade cada medición
+a un fichero JSONL y VALOR_METRICS_PORT sirve /metrics por HTTP.
+"""
+import json
+import os
+import socket
+import threading
+import time
+from collections import defaultdict, deque
+from contextlib import contextmanager
+from functools import wraps
+
+import numpy as np
+
+BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+RECENT = 1000  # muestras recientes por etapa para p50/p95 locales
+CACHE_EVENTS = ('hit', 'miss', 'expiry', 'stale')  # stale: caducado pero servido mientras se recalcula
+REPLICA = os.environ.get("VALOR_REPLICA", socket.gethostname())
+
+
+class Registry:
+
+    def __init__(self, log_path=None):
+        self._lock = threading.Lock()
+        self._stages = {}
+        self._caches = defaultdict(lambda: dict.fromkeys(CACHE_EVENTS, 0))
+        self._memory = {}
+        self.log_path = log_path
+
+    def observe(self, stage, seconds):
+        with self._lock:
+            s = self._stages.get(stage)
+            if s is None:
+                s = self._stages[stage] = {'count': 0, 'sum': 0.0, 'buckets': [0] * len(BUCKETS),
+                                           'recent': deque(maxlen=RECENT), 'last': 0.0}
+            s['count'] += 1
+            s['sum'] += seconds
+            s['last'] = seconds
+            s['recent'].append(seconds)
+            for i, b in enumerate(BUCKETS):
+                if seconds <= b: s['buckets'][i] += 1
+        if self.log_path: self._log({'type': 'stage', 'stage': stage, 'seconds': round(seconds, 6)})
+
+    def cache_event(self, func, event):
+        if event not in CACHE_EVENTS: raise ValueError(f"Evento de caché desconocido: {event}")
+        with self._lock: self._caches[func][event] += 1
+        if self.log_path: self._log({'type': 'cache', 'func': func, 'event': event})
+
+    def track_memory(self, name, cache):
+        """Registra una caché acotada (con `.stats()`) para informar de su uso de memoria."""
+        with self._lock: self._memory[name] = cache
+
+    def _log(self, record):
+        record.update(ts=time.time(), replica=REPLICA)
+        try:
+            with open(self.log_path, "a") as f: f.write(json.dumps(record) + "\n")
+        except OSError: pass
+
+    @contextmanager
+    def timed(self, stage):
+        t0 = time.perf_counter()
+        try: yield
+        finally: self.observe(stage, time.perf_counter() - t0)
+
+    def timer(self, stage):
+        """Decorador equivalente a `with timed(stage)`."""
+        def deco(fn):
+            @wraps(fn)
+            def wrapper(*args, **kwargs):
+                with self.timed(stage): return fn(*args, **kwargs)
+            return wrapper
+        return deco
+
+    # --- Lectura / exportación ---
+
+    def stages(self):
+        """{etapa: {count, sum, last, p50, p95}} (percentiles sobre las muestras recientes)."""
+        with self._lock: items = [(k, dict(v, recent=list(v['recent']))) for k, v in self._stages.items()]
+        out = {}
+        for k, v in sorted(items):
+            p50, p95 = np.percentile(v['recent'], [50, 95]) if v['recent'] else (0.0, 0.0)
+            out[k] = {'count': v['count'], 'sum': v['sum'], 'last': v['last'], 'p50': float(p50), 'p95': float(p95)}
+        return out
+
+    def caches(self):
+        with self._lock: return {k: dict(v) for k, v in sorted(self._caches.items())}
+
+    def memory(self):
+        """{caché: {entries, bytes, max_bytes, evictions}}."""
+        with self._lock: tracked = dict(self._memory)
+        return {k: c.stats() for k, c in sorted(tracked.items())}
+
+    def to_jsonl(self):
+        lines = [json.dumps({'type': 'stage', 'stage': k, 'replica': REPLICA, **v}) for k, v in self.stages().items()]
+        lines += [json.dumps({'type': 'cache', 'func': k, 'replica': REPLICA, **v}) for k, v in self.caches().items()]
+        lines += [json.dumps({'type': 'memory', 'cache': k, 'replica': REPLICA, **v}) for k, v in self.memory().items()]
+        return "\n".join(lines) + ("\n" if lines else "")
+
+    def to_prometheus(self):
+        with self._lock:
+            stages = {k: (v['count'], v['sum'], list(v['buckets'])) for k, v in self._stages.items()}
+            caches = {k: dict(v) for k, v in self._caches.items()}
+        out = ["# HELP valor_stage_seconds Duración de cada etapa de obtención o cálculo.",
+               "# TYPE valor_stage_seconds histogram"]
+        for stage, (count, total, buckets) in sorted(stages.items()):
+            labels = f'stage="{stage}",replica="{REPLICA}"'
+            for b, n in zip(BUCKETS, buckets): out.append(f'valor_stage_seconds_bucket{{{labels},le="{b}"}} {n}')
+            out.append(f'valor_stage_seconds_bucket{{{labels},le="+Inf"}} {count}')
+            out.append(f'valor_stage_seconds_sum{{{labels}}} {total}')
+            out.append(f'valor_stage_seconds_count{{{labels}}} {count}')
+        out += ["# HELP valor_cache_events_total Aciertos, fallos, expiraciones y datos obsoletos servidos por función.",
+                "# TYPE valor_cache_events_total counter"]
+        for func, events in sorted(caches.items()):
+            for event, n in events.items():
+                out.append(f'valor_cache_events_total{{func="{func}",event="{event}",replica="{REPLICA}"}} {n}')
+        memory = self.memory()
+        for metric, field, kind, help_ in (('valor_cache_bytes', 'bytes', 'gauge', "Bytes ocupados por cada caché acotada."),
+                                           ('valor_cache_entries', 'entries', 'gauge', "Entradas en cada caché acotada."),
+                                           ('valor_cache_evictions_total', 'evictions', 'counter', "Desalojos LRU por presupuesto de memoria.")):
+            out += [f"# HELP {metric} {help_}", f"# TYPE {metric} {kind}"]
+            out += [f'{metric}{{cache="{k}",replica="{REPLICA}"}} {v[field]}' for k, v in memory.items()]
+        return "\n".join(out) + "\n"
+
+    def reset(self):
+        with self._lock:
+            self._stages.clear()
+            self._caches.clear()
+
+
+registry = Registry(os.environ.get("VALOR_METRICS_LOG"))
+timed, timer, observe, cache_event = registry.timed, registry.timer, registry.observe, registry.cache_event
+
+
+def serve(port, reg=registry):
+    """Expone /metrics (Prometheus) en un hilo de fondo."""
+    from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            body = reg.to_prometheus().encode() if self.path.startswith("/metrics") else b""
+            self.send_response(200 if body else 404)
+            self.send_header("Content-Type", "text/plain; version=0.0.4")
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args): pass
+
+    server = ThreadingHTTPServer(("0.0.0.0", int(port)), Handler)
+    threading.Thread(target=server.serve_forever, daemon=True, name="metrics").start()
+    return server
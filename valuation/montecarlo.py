@@ -0,0 +1,77 @@
+"""
+Motor Monte Carlo vectorizado para la proyección a 5 años.
+
+Muestrea crecimiento y PER de salida, evalúa eps * (1+g)^n * pe para todos los
+caminos a la vez y resume con percentiles. 100k caminos tardan unos pocos ms.
+"""
+import numpy as np
+
+from valuation import projection
+
+N_PATHS = 100_000
+SEED = 42  # semilla fija: los percentiles no "bailan" entre reruns con los mismos inputs
+PERCENTILES = (5, 50, 95)
+FAN_PERCENTILES = (5, 25, 50, 75, 95)
+GROWTH_DISTS = ('normal', 'uniform')
+PE_DISTS = ('triangular', 'uniform')
+
+
+def default_growth_sd(growth):
+    """Desviación por defecto del crecimiento (pp): 30% del valor central, mínimo 2 pp."""
+    return max(abs(growth) * 0.3, 2.0)
+
+
+def sample_growth(rng, n, mean, sd, dist='normal'):
+    """Crecimiento anual en %. 'uniform' usa el rango mean ± sd·√3 (misma desviación típica)."""
+    if dist == 'normal': return rng.normal(mean, sd, n)
+    if dist == 'uniform': return rng.uniform(mean - sd * np.sqrt(3), mean + sd * np.sqrt(3), n)
+    raise ValueError(f"Distribución de crecimiento desconocida: {dist}")
+
+
+def sample_pe(rng, n, low, mode, high, dist='triangular'):
+    """PER de salida entre `low` y `high` (por defecto: min/mediana/max históricos)."""
+    low, high = min(low, high), max(low, high)
+    if high - low < 1e-9: return np.full(n, float(mode))
+    if dist == 'triangular': return rng.triangular(low, min(max(mode, low), high), high, n)
+    if dist == 'uniform': return rng.uniform(low, high, n)
+    raise ValueError(f"Distribución de PER desconocida: {dist}")
+
+
+def pe_bounds(hist_ratios, exit_pe):
+    """(min, moda, max) del PER: el rango p5/mediana/p95 histórico, o ±40% del PER de salida."""
+    per = hist_ratios.get('PER')
+    if per: return per['min'], per['median'], per['max']
+    return exit_pe * 0.6, exit_pe, exit_pe * 1.4
+
+
+def simulate(eps, price, growth_mean, growth_sd, pe_low, pe_mode, pe_high, growth_dist='normal',
+             pe_dist='triangular', n=N_PATHS, years=projection.YEARS, seed=SEED):
+    """
+    Devuelve un dict con:
+      'price' / 'cagr' / 'growth' / 'pe': {percentil: valor} para PERCENTILES
+      (growth y pe son los valores típicos de los caminos que caen en ese percentil de precio),
+      'fan': array (len(FAN_PERCENTILES), years+1) con el valor teórico año a año.
+    """
+    rng = np.random.default_rng(seed)
+    g = sample_growth(rng, n, growth_mean, growth_sd, growth_dist)
+    pe = sample_pe(rng, n, pe_low, pe_mode, pe_high, pe_dist)
+    prices = projection.project_price(eps, g, pe, years)
+
+    order = np.argsort(prices)
+    band = max(n // 200, 1)  # ±0.5% de caminos alrededor de cada percentil
+    out = {'price': {}, 'cagr': {}, 'growth': {}, 'pe': {}, 'n': n}
+    for q in PERCENTILES:
+        i = min(int(q / 100 * (n - 1)), n - 1)
+        idx = order[max(i - band, 0): i + band + 1]
+        p = float(prices[order[i]])
+        out['price'][q] = p
+        out['cagr'][q] = projection.cagr(p, price, years)
+        out['growth'][q] = float(np.median(g[idx]))
+        out['pe'][q] = float(np.median(pe[idx]))
+
+    # El CAGR es monótono en el precio final: los percentiles del valor en cada año
+    # salen directamente de los percentiles de precio, sin recorrer los caminos.
+    fan_final = prices[order[np.minimum((np.array(FAN_PERCENTILES) / 100 * (n - 1)).astype(int), n - 1)]]
+    fan_cagr = np.atleast_1d(projection.cagr(fan_final, np.full(len(FAN_PERCENTILES), price), years)) / 100
+    out['fan'] = price * (1 + fan_cagr[:, None]) ** np.arange(years + 1)[None, :]
+    return out
@@ -0,0 +1,82 @@
+"""
+Matemática de valoración y proyección a 5 años.
+Todas las funciones aceptan escalares o arrays de NumPy (se evalúan vectorizadas).
+"""
+import numpy as np
+
+YEARS = 5
+DEFAULT_PE = 15.0
+# Margen (%) a partir del cual el veredicto deja de ser "precio justo".
+VERDICT_MARGIN = 15.0
+VERDICTS = ("INFRAVALORADA", "PRECIO JUSTO", "SOBREVALORADA")
+
+
+def base_eps(info):
+    """EPS de partida: trailing, si no forward, si no 1 (igual que la página individual)."""
+    eps = info.get('trailingEps', 0) or info.get('forwardEps', 1)
+    return 1.0 if eps is None else float(eps)
+
+
+def historical_pe(info, hist_ratios):
+    """Priorizar PER calculado robustamente, sino usar Yahoo, sino 15x."""
+    if 'PER' in hist_ratios: return float(hist_ratios['PER']['median'])
+    if info.get('trailingPE'): return float(info['trailingPE'])
+    return DEFAULT_PE
+
+
+def fair_value(eps, pe):
+    return np.multiply(eps, pe)
+
+
+def project_price(eps, growth, exit_pe, years=YEARS):
+    """Precio a `years` años: EPS * (1 + g)^n * PER de salida (`growth` en %)."""
+    return np.multiply(eps, (1 + np.divide(growth, 100)) ** years) * exit_pe
+
+
+def cagr(future_price, price, years=YEARS):
+    """
+    CAGR en %. Una proyección <= 0 es una pérdida total (-100%); NaN donde el precio actual
+    no es positivo o algún dato no es finito (p. ej. crecimiento NaN), para que no pase por un 0%.
+    """
+    future_price, price = np.asarray(future_price, dtype=float), np.asarray(price, dtype=float)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        out = (np.power(np.maximum(future_price, 0) / price, 1 / years) - 1) * 100
+    out = np.where((price > 0) & np.isfinite(future_price) & np.isfinite(out), out, np.nan)
+    return out if out.ndim else float(out)
+
+
+def margin(price, fair):
+    """Margen de seguridad en % sobre el precio actual."""
+    with np.errstate(divide='ignore', invalid='ignore'):
+        return (np.subtract(fair, price) / price) * 100
+
+
+def verdict(margin_pct):
+    """Índice de veredicto: 0 infravalorada, 1 precio justo, 2 sobrevalorada."""
+    m = np.asarray(margin_pct, dtype=float)
+    out = np.select([m > VERDICT_MARGIN, m < -VERDICT_MARGIN], [0, 2], default=1)
+    return out if out.ndim else int(out)
+
+
+def sensitivity_grid(eps, price, growths, pes, years=YEARS):
+    """
+    Superficie precio/CAGR sobre todas las combinaciones crecimiento x PER de salida.
+    Devuelve (f_price, cagr) con forma (len(growths), len(pes)), en una sola operación con broadcasting.
+    """
+    growths, pes = np.asarray(growths, dtype=float), np.asarray(pes, dtype=float)
+    f_price = project_price(eps, growths[:, None], pes[None, :], years)
+    return f_price, cagr(f_price, price, years)
+
+
+def validate_projection(growth, exit_pe, cagr, price):
+    """
+    Avisos sobre supuestos agresivos. Cada aviso: {'type', 'msg', 'emphasis'},
+    donde `emphasis` es el fragmento de `msg` que la UI resalta.
+    """
+    warnings = []
+    checks = [(growth > 25, f"Crecimiento de {growth:.1f}%", "es muy agresivo."),
+              (exit_pe > 40, f"PER de {exit_pe:.1f}x", "sugiere valoración premium."),
+              (cagr > 25, f"CAGR de {cagr:.1f}%", "es excelente pero ambicioso.")]
+    for hit, emphasis, rest in checks:
+        if hit: warnings.append({"type": "warning", "msg": f"{emphasis} {rest}", "emphasis": emphasis})
+    return warnings
@@ -0,0 +1,236 @@
+"""
+Motor de ratios históricos en una sola pasada.
+
+Los estados financieros se reducen a una tabla de fundamentales por periodo
+(EPS, ventas, EBITDA y FCF TTM, acciones, patrimonio, deuda, caja), que se cruza
+una única vez con el índice de precios mediante `merge_asof` (cada fecha toma
+el último dato ya publicado). Todos los ratios son después operaciones de
+columna vectorizadas, y el filtrado y los cuantiles se hacen en una sola llamada.
+
+La serie mensual de cada ratio se conserva (`ratio_history`) con su percentil y z-score
+frente a la propia historia en cada fecha, calculados de forma incremental.
+"""
+import warnings
+from bisect import bisect_left, bisect_right, insort
+from collections import deque
+
+import numpy as np
+import pandas as pd
+
+from valuation import metrics
+from valuation.upstream import UpstreamError
+
+# Rangos válidos (excluyentes) por ratio: fuera de ellos se consideran outliers.
+RATIO_BOUNDS = {
+    'PER': (0, 200),
+    'Price/Sales': (0, 50),
+    'Price/Book': (0, 50),
+    'EV/EBITDA': (0, 100),
+    'P/FCF': (0, 200),
+    'Earnings Yield': (0.5, 100),  # % (equivale a PER entre 1 y 200)
+}
+VERSION = 3  # forma y convenciones (percentil) del resumen de robust_ratios: forma parte de la clave de caché
+ROLLING_WINDOW = 60  # observaciones (5 años mensuales) del percentil móvil
+MIN_PERIODS = 12     # historia mínima para dar percentil y z-score
+
+_EPS = ['Diluted EPS', 'Basic EPS']
+_REVENUE = ['Total Revenue', 'Total Income']
+_SHARES = ['Basic Average Shares', 'Ordinary Shares Number', 'Share Issued']
+_EBITDA = ['EBITDA', 'Normalized EBITDA']
+_ASSETS = ['Total Assets']
+_LIABILITIES = ['Total Liabilities Net Minority Interest', 'Total Liabilities']
+_DEBT = ['Total Debt']
+_CASH = ['Cash And Cash Equivalents', 'Cash Cash Equivalents And Short Term Investments']
+_FCF = ['Free Cash Flow']
+
+
+def _get_col(df, candidates):
+    for c in candidates:
+        if c in df.columns: return df[c]
+    return None
+
+
+def _periods(statement):
+    """Estado (partidas x periodos) -> periodos x partidas, ordenado por fecha."""
+    df = statement.T
+    if df.empty: return df
+    df.index = pd.to_datetime(df.index)
+    if df.index.tz is not None: df.index = df.index.tz_localize(None)
+    return df.sort_index()
+
+
+@metrics.timer("ratios.fundamentals")
+def fundamentals(market, ticker):
+    """
+    Tabla de fundamentales por fecha de cierre de periodo.
+    Usa fallback: Trimestral (sumas TTM) -> Anual, igual para resultados y flujos de caja.
+    """
+    q_fin, a_fin = _periods(market.statement(ticker, 'quarterly_financials')), _periods(market.statement(ticker, 'financials'))
+    q_eps = _get_col(q_fin, ['Diluted EPS'])
+    use_quarterly = q_eps is not None and not q_eps.rolling(4).sum().dropna().empty
+    fin = q_fin if use_quarterly else a_fin
+    ttm = (lambda s: s.rolling(4).sum()) if use_quarterly else (lambda s: s)
+
+    cols = {}
+    if not fin.empty:
+        cols['eps'] = ttm(q_eps) if use_quarterly else _get_col(fin, _EPS)
+        for key, candidates in (('revenue', _REVENUE), ('ebitda', _EBITDA)):
+            s = _get_col(fin, candidates)
+            if s is not None: cols[key] = ttm(s)
+        cols['shares'] = _get_col(fin, _SHARES[:2])
+        cols['shares_ps'] = _get_col(fin, _SHARES)
+
+    q_bs, a_bs = _periods(market.statement(ticker, 'quarterly_balance_sheet')), _periods(market.statement(ticker, 'balance_sheet'))
+    bs = q_bs if not q_bs.empty else a_bs
+    assets, liabs = _get_col(bs, _ASSETS), _get_col(bs, _LIABILITIES)
+    if assets is not None and liabs is not None: cols['book'] = assets - liabs
+    cols['debt'], cols['cash'] = _get_col(bs, _DEBT), _get_col(bs, _CASH)
+
+    q_cf = _periods(market.statement(ticker, 'quarterly_cashflow'))
+    cf = q_cf if use_quarterly and not q_cf.empty else _periods(market.statement(ticker, 'cashflow'))
+    fcf = _get_col(cf, _FCF)
+    if fcf is not None: cols['fcf'] = ttm(fcf) if cf is q_cf else fcf
+
+    cols = {k: v.astype(float) for k, v in cols.items() if v is not None}
+    if not cols: return pd.DataFrame()
+    # Cada columna conserva su último valor publicado en las fechas de los otros estados.
+    return pd.DataFrame(cols).sort_index().ffill()
+
+
+@metrics.timer("ratios.frame")
+def ratio_frame(market, ticker, years=10, interval="1mo", report_lag_days=0):
+    """
+    Precio + fundamentales alineados y todos los ratios por fecha del histórico.
+    `report_lag_days` retrasa la disponibilidad de cada periodo (point-in-time);
+    0 reproduce el criterio histórico de la app (dato vigente desde el cierre del periodo).
+    """
+    hist = market.history(ticker, years, interval=interval)
+    fund = fundamentals(market, ticker)
+    if hist.empty or fund.empty: return pd.DataFrame()
+
+    fund = fund.copy()
+    fund.index = fund.index + pd.Timedelta(days=report_lag_days)
+    prices = hist[['Close']].rename(columns={'Close': 'Price'})
+    df = pd.merge_asof(prices, fund, left_index=True, right_index=True, direction='backward')
+
+    # Ratios como operaciones sobre arrays; el DataFrame se amplía una sola vez.
+    col = lambda c: df[c].to_numpy(float) if c in df.columns else np.full(len(df), np.nan)
+    price, eps, shares = col('Price'), col('eps'), col('shares')
+    with np.errstate(divide='ignore', invalid='ignore'):
+        net_debt_ps = (col('debt') - np.nan_to_num(col('cash'))) / shares
+        out = {
+            'PER': price / eps,
+            'Price/Sales': price / (col('revenue') / col('shares_ps')),
+            'Price/Book': price / (col('book') / shares),
+            'EV/EBITDA': (price + net_debt_ps) / (col('ebitda') / shares),
+            'P/FCF': price / (col('fcf') / shares),
+            'Earnings Yield': eps / price * 100,
+        }
+    return df.assign(**out)
+
+
+def _filtered(df):
+    """(nombres, matriz fechas x ratios) con los outliers fuera de RATIO_BOUNDS como NaN."""
+    names = [n for n in RATIO_BOUNDS if n in df.columns]
+    if not names or df.empty: return [], np.empty((0, 0))
+    r = df[names].to_numpy(float)
+    lo, hi = np.array([RATIO_BOUNDS[n] for n in names]).T
+    return names, np.where((r > lo) & (r < hi), r, np.nan)
+
+
+def _finite(x):
+    return float(x) if np.isfinite(x) else None
+
+
+def rank_series(values, window=None, min_periods=MIN_PERIODS):
+    """
+    Percentil (0-100) y z-score de cada valor frente a la historia hasta su fecha: expansiva,
+    o las últimas `window` observaciones válidas. Incremental: la ventana se mantiene ordenada
+    con inserciones y borrados por bisección, y media/varianza con sumas acumuladas.
+    Percentil como pandas (`expanding()/rolling(window).rank(pct=True) * 100`, rango medio en
+    los empates, el propio valor incluido). Los NaN no entran en la historia.
+    """
+    values = np.asarray(values, dtype=float)
+    pct, z = np.full(len(values), np.nan), np.full(len(values), np.nan)
+    ordered, arrivals = [], deque()
+    total = total_sq = 0.0
+    shift = None  # las sumas van sobre v - shift: una historia constante da varianza exactamente 0
+    for i, v in enumerate(values.tolist()):
+        if v != v: continue  # NaN
+        if shift is None: shift = v
+        insort(ordered, v)
+        arrivals.append(v)
+        total, total_sq = total + (v - shift), total_sq + (v - shift) ** 2
+        if window and len(arrivals) > window:
+            old = arrivals.popleft()
+            del ordered[bisect_left(ordered, old)]
+            total, total_sq = total - (old - shift), total_sq - (old - shift) ** 2
+        n = len(ordered)
+        if n < min_periods: continue
+        below, upto = bisect_left(ordered, v), bisect_right(ordered, v)
+        pct[i] = 100 * (below + (upto - below + 1) / 2) / n
+        mean = total / n
+        sd = np.sqrt(max(total_sq / n - mean * mean, 0.0))
+        if sd > 1e-12 * abs(mean + shift): z[i] = (v - shift - mean) / sd
+    return pct, z
+
+
+def rank_frame(df, window=None, min_periods=MIN_PERIODS):
+    """Serie de cada ratio (sin outliers) con su percentil y z-score: columnas (ratio, 'value'|'pct'|'z')."""
+    names, r = _filtered(df)
+    cols = {}
+    for i, n in enumerate(names):
+        pct, z = rank_series(r[:, i], window, min_periods)
+        cols[(n, 'value')], cols[(n, 'pct')], cols[(n, 'z')] = r[:, i], pct, z
+    if not cols: return pd.DataFrame()
+    return pd.DataFrame(cols, index=df.index)
+
+
+@metrics.timer("ratios.summarize")
+def summarize(df):
+    """
+    {ratio: {median, min (p5), max (p95), current, pct, z}} filtrando outliers; cuantiles de todos
+    los ratios a la vez. `current` es el último valor válido y `pct`/`z` su posición en la historia
+    (None si la historia es corta o constante), para ordenar un universo sin recalcular las series.
+    """
+    names, r = _filtered(df)
+    if not names: return {}
+    counts = np.count_nonzero(~np.isnan(r), axis=0)
+    with warnings.catch_warnings():
+        warnings.simplefilter('ignore', RuntimeWarning)  # columnas sin datos válidos
+        q = np.nanquantile(r, [0.05, 0.5, 0.95], axis=0)
+    out = {}
+    for i, n in enumerate(names):
+        if counts[i] == 0: continue
+        col = r[:, i]
+        last = np.flatnonzero(~np.isnan(col))[-1]
+        pct, z = rank_series(col[:last + 1])
+        out[n] = {'median': float(q[1, i]), 'min': float(q[0, i]), 'max': float(q[2, i]),
+                  'current': float(col[last]), 'pct': _finite(pct[-1]), 'z': _finite(z[-1])}
+    return out
+
+
+def latest_fundamentals(market, ticker):
+    """Último valor publicado de cada fundamental (FCF TTM, acciones, deuda...), o {} si no hay datos."""
+    try: fund = fundamentals(market, ticker)
+    except UpstreamError: raise
+    except Exception: return {}
+    if fund.empty: return {}
+    return {k: float(v) for k, v in fund.iloc[-1].items() if pd.notna(v)}
+
+
+def ratio_history(market, ticker, years=10, window=None, interval="1mo"):
+    """Historia mensual de los ratios con percentil y z-score (ver rank_frame); vacía si no hay datos."""
+    try: return rank_frame(ratio_frame(market, ticker, years, interval), window)
+    except UpstreamError: raise
+    except Exception: return pd.DataFrame()
+
+
+def robust_ratios(market, ticker, years=10, interval="1mo"):
+    """
+    Cálculo ROBUSTO de ratios históricos.
+    Devuelve diccionario con {median, min, max} para cada ratio.
+    """
+    try: return summarize(ratio_frame(market, ticker, years, interval))
+    except UpstreamError: raise  # no es "sin datos": que la caché no lo guarde
+    except Exception: return {}
@@ -0,0 +1,89 @@
+"""
+Registro compacto del análisis de un ticker (lo que se guarda en caché).
+
+En lugar del dict `info` de yfinance (más de 100 claves) y la Serie de dividendos,
+se guardan solo los campos que usan la app, la CLI y el screener, con los dividendos
+como dos arrays (fechas datetime64[D] e importes float64).
+"""
+from dataclasses import dataclass, fields
+
+import numpy as np
+import pandas as pd
+
+from valuation import projection
+
+VERSION = 4  # forma del registro: forma parte de la clave de caché
+
+
+def _num(value):
+    try: return None if value is None else float(value)
+    except (TypeError, ValueError): return None
+
+
+@dataclass(frozen=True, slots=True)
+class AnalysisRecord:
+    ticker: str
+    name: str
+    sector: str | None
+    industry: str | None
+    price: float
+    eps: float                  # EPS base de la proyección (trailing, si no forward)
+    pe_mean: float              # PER histórico (mediana robusta, si no trailing, si no 15x)
+    trailing_pe: float | None
+    forward_pe: float | None
+    price_to_sales: float | None
+    price_to_book: float | None
+    ev_to_ebitda: float | None
+    price_to_fcf: float | None
+    fcf_per_share: float | None  # FCF TTM por acción (base del DCF)
+    dividend_rate: float
+    dividend_yield: float       # fracción (0.025 = 2,5%)
+    target_price: float | None
+    ratios: dict                # {ratio: {median, min, max}}
+    div_dates: np.ndarray       # datetime64[D]
+    div_amounts: np.ndarray     # float64
+    growth: float | None        # crecimiento estimado (5y) %
+    growth_source: str | None
+    as_of: float
+
+    @classmethod
+    def build(cls, ticker, info, hist_ratios, dividends, growth=None, growth_source=None, as_of=0.0, fcf_per_share=None,
+              fundamentals=None):
+        """
+        A partir del `info` de Yahoo, los ratios históricos, la Serie de dividendos y los últimos
+        fundamentales de los estados (ratios.latest_fundamentals).
+        """
+        price = float(info.get('currentPrice') or info.get('regularMarketPrice'))
+        div_rate = _num(info.get('dividendRate')) or 0.0
+        fund = fundamentals or {}
+        fcf, shares = _num(fund.get('fcf')), _num(fund.get('shares'))
+        return cls(
+            ticker=ticker, name=info.get('shortName', ticker), sector=info.get('sector'), industry=info.get('industry'),
+            price=price, eps=projection.base_eps(info), pe_mean=float(projection.historical_pe(info, hist_ratios)),
+            trailing_pe=_num(info.get('trailingPE')), forward_pe=_num(info.get('forwardPE')),
+            price_to_sales=_num(info.get('priceToSalesTrailing12Months')), price_to_book=_num(info.get('priceToBook')),
+            ev_to_ebitda=_num(info.get('enterpriseToEbitda')),
+            # Misma fórmula y FCF de los estados que el P/FCF histórico (ratios.ratio_frame), no el de `info`.
+            price_to_fcf=price / (fcf / shares) if fcf and fcf > 0 and shares and shares > 0 else None,
+            fcf_per_share=_num(fcf_per_share),
+            dividend_rate=div_rate, dividend_yield=div_rate / price if div_rate and price > 0 else 0.0,
+            target_price=_num(info.get('targetMeanPrice')),
+            ratios={k: {s: _num(v) for s, v in stats.items()} for k, stats in (hist_ratios or {}).items()},
+            div_dates=pd.DatetimeIndex(dividends.index).to_numpy().astype('datetime64[D]'),
+            div_amounts=dividends.to_numpy(dtype=np.float64),
+            growth=_num(growth), growth_source=growth_source, as_of=as_of,
+        )
+
+    @property
+    def has_dividends(self):
+        return bool(self.dividend_rate) and len(self.div_amounts) > 0
+
+    @property
+    def dividends(self):
+        """Los dividendos como Serie de pandas (se construye al pedirla)."""
+        return pd.Series(self.div_amounts, index=pd.DatetimeIndex(self.div_dates, name='Date'), name='Dividends')
+
+    def nbytes(self):
+        """Tamaño aproximado en memoria (para el presupuesto de la caché)."""
+        from valuation.cache import approx_bytes
+        return sum(approx_bytes(getattr(self, f.name)) for f in fields(self)) + 64
@@ -0,0 +1,111 @@
+"""
+Screener de universo: valora cientos de tickers de una vez.
+
+1. Precios en bloque (yf.download) a través del almacén.
+2. Fundamentales (info + ratios históricos) con un pool de hilos acotado.
+3. Valor razonable, proyección a 5 años, CAGR, veredicto, DCF y crecimiento implícito
+   en una sola pasada vectorizada.
+4. Percentil actual del PER frente a su propia historia (viene en el resumen de ratios:
+   ordenar el universo por él no recalcula ninguna serie).
+"""
+import re
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+from valuation import dcf, projection
+from valuation.ratios import latest_fundamentals, robust_ratios
+from valuation.upstream import UpstreamError
+
+MAX_WORKERS = 8
+COLUMNS = ['Ticker', 'Nombre', 'Sector', 'Precio', 'EPS', 'PER Hist', 'Valor Razonable', 'Margen %',
+           'Veredicto', 'Crecimiento %', 'PER Salida', 'Precio 5A', 'CAGR %', 'FCF/Acción', 'Valor DCF',
+           'Crec. Implícito %', 'Percentil PER']
+# Columna -> ascendente: lo más barato (o lo que más descuenta el precio) primero.
+SORT_KEYS = {'Margen %': False, 'Percentil PER': True, 'Crec. Implícito %': True, 'CAGR %': False}
+
+
+def parse_tickers(text):
+    """Lista de tickers desde texto pegado (separados por comas, espacios o saltos de línea)."""
+    return list(dict.fromkeys(t.upper() for t in re.split(r'[\s,;]+', text or '') if t))
+
+
+def tickers_from_csv(df):
+    """Tickers (y crecimiento opcional por ticker) desde un CSV: columna 'ticker'/'symbol' o la primera."""
+    cols = {c.lower(): c for c in df.columns}
+    col = cols.get('ticker') or cols.get('symbol') or df.columns[0]
+    tickers = df[col].astype(str).str.upper().str.strip()
+    growth = None
+    g_col = cols.get('growth') or cols.get('crecimiento')
+    if g_col:  # celdas vacías o no numéricas: sin crecimiento propio (se usa el estimado), no NaN
+        growth = {t: float(g) for t, g in zip(tickers, pd.to_numeric(df[g_col], errors='coerce')) if np.isfinite(g)}
+    return list(dict.fromkeys(t for t in tickers if t)), growth
+
+
+def _or_nan(value):
+    return np.nan if value is None else float(value)
+
+
+def _fundamentals(market, ticker, years):
+    try:
+        info = market.info(ticker)
+        price = info.get('currentPrice') or info.get('regularMarketPrice')
+        hist_ratios = robust_ratios(market, ticker, years)
+        return {'Ticker': ticker, 'Nombre': info.get('shortName', ticker), 'Sector': info.get('sector'),
+                'Precio': float(price) if price else np.nan, 'EPS': projection.base_eps(info),
+                'PER Hist': projection.historical_pe(info, hist_ratios),
+                'FCF/Acción': dcf.fcf_per_share(latest_fundamentals(market, ticker)),
+                'Percentil PER': _or_nan(hist_ratios.get('PER', {}).get('pct'))}
+    except UpstreamError: raise  # Yahoo caído y sin datos guardados: no es "sin datos" ni debe cachearse
+    except Exception:
+        return {'Ticker': ticker, 'Precio': np.nan}
+
+
+def screen(market, tickers, growth=10.0, exit_pe=None, years=10, max_workers=MAX_WORKERS):
+    """
+    Tabla de valoración del universo.
+    `growth`: % común o dict {ticker: %} (los que falten usan 10%).
+    `exit_pe`: PER de salida común; por defecto el PER histórico de cada ticker.
+    """
+    market.prefetch(tickers, years)
+    with ThreadPoolExecutor(max_workers=max_workers) as pool:
+        rows = list(pool.map(lambda t: _fundamentals(market, t, years), tickers))
+    df = pd.DataFrame(rows).reindex(columns=COLUMNS)
+
+    if isinstance(growth, dict): df['Crecimiento %'] = df['Ticker'].map(growth).fillna(10.0)
+    else: df['Crecimiento %'] = float(growth)
+    df['PER Salida'] = df['PER Hist'] if exit_pe is None else float(exit_pe)
+    return value_universe(df)
+
+
+def value_universe(df):
+    """
+    Pasada vectorizada sobre columnas Precio, EPS, PER Hist, Crecimiento %, PER Salida y FCF/Acción.
+    El crecimiento implícito del DCF inverso se resuelve para todo el universo en una llamada.
+    """
+    price, eps = df['Precio'].to_numpy(float), df['EPS'].to_numpy(float)
+    fair = projection.fair_value(eps, df['PER Hist'].to_numpy(float))
+    f_price = projection.project_price(eps, df['Crecimiento %'].to_numpy(float), df['PER Salida'].to_numpy(float))
+    margin = projection.margin(price, fair)
+    valid = np.isfinite(price) & (price > 0) & np.isfinite(fair)
+
+    df = df.copy()
+    # Sin precio válido la fila no se valora: EPS, PER Hist y Valor Razonable quedan vacíos, no con
+    # lo que base_eps/historical_pe devuelven cuando faltan datos.
+    df['EPS'] = np.where(valid, eps, np.nan)
+    df['PER Hist'] = np.where(valid, df['PER Hist'].to_numpy(float), np.nan)
+    df['Valor Razonable'] = np.where(valid, fair, np.nan)
+    df['Margen %'] = np.where(valid, margin, np.nan)
+    df['Veredicto'] = np.where(valid, np.asarray(projection.VERDICTS, dtype=object)[projection.verdict(margin)], None)
+    df['Precio 5A'] = np.where(valid, f_price, np.nan)
+    df['CAGR %'] = np.where(valid, projection.cagr(f_price, price), np.nan)
+    fcf = df['FCF/Acción'].to_numpy(float)
+    df['Valor DCF'] = np.where(fcf > 0, dcf.dcf_value(fcf, df['Crecimiento %'].to_numpy(float)), np.nan)
+    df['Crec. Implícito %'] = dcf.implied_growth(np.where(valid, price, np.nan), fcf)
+    return rank(df)
+
+
+def rank(df, by='Margen %'):
+    """Ordena la tabla por una de SORT_KEYS (sin datos al final)."""
+    return df.sort_values(by, ascending=SORT_KEYS[by], na_position='last').reset_index(drop=True)
@@ -0,0 +1,73 @@
+"""
+Funciones de datos cacheadas en la caché compartida, comunes a la app y al precalentador.
+
+Al estar definidas en un único sitio, la app de Streamlit y `python -m valuation.warmer`
+calculan exactamente las mismas claves: lo que precalienta uno lo sirve la otra.
+"""
+import os
+import time
+from functools import lru_cache
+
+from valuation import analysis, ratios, records, weiss
+from valuation.cache import SharedCache
+from valuation.data import MarketData
+from valuation.growth import GrowthEstimator
+from valuation.ratios import ratio_history, robust_ratios
+from valuation.upstream import UpstreamError
+
+TTL = 3600
+STALE_TTL = 7 * 86400  # margen en el que se sirve el último análisis bueno mientras se refresca en segundo plano
+RETRY_TTL = 60  # análisis hecho con datos atrasados (Yahoo caído): se reintenta pronto
+
+shared = SharedCache()
+
+
+@lru_cache(maxsize=None)
+def get_market_data():
+    """Capa única de datos (almacén en disco + memo en proceso), compartida por todas las sesiones."""
+    return MarketData()
+
+
+@lru_cache(maxsize=None)
+def get_growth_estimator():
+    """Proveedores de crecimiento en paralelo; VALOR_GROWTH_MODE=first|median|mean."""
+    return GrowthEstimator(mode=os.environ.get("VALOR_GROWTH_MODE", "first"))
+
+
+@shared.memoize(ttl=TTL, stale_ttl=STALE_TTL)
+def get_growth_estimate(ticker):
+    return get_growth_estimator().estimate(ticker)
+
+
+@shared.memoize(ttl=TTL, stale_ttl=STALE_TTL, version=ratios.VERSION)
+def calculate_robust_ratios(ticker, years=10):
+    return robust_ratios(get_market_data(), ticker, years)
+
+
+@shared.memoize(ttl=TTL, stale_ttl=STALE_TTL, version=ratios.VERSION)
+def get_ratio_history(ticker, years=10, window=None):
+    """Serie mensual de ratios con percentil y z-score (expansivo, o móvil de `window` meses)."""
+    return ratio_history(get_market_data(), ticker, years, window)
+
+
+@shared.memoize(ttl=TTL, stale_ttl=STALE_TTL)
+def get_weiss_data(ticker, years=10):
+    """Rentabilidades Weiss de referencia + series reducidas para el gráfico, o (None, None)."""
+    market = get_market_data()
+    bands = weiss.weiss_bands(market.history(ticker, years, interval="1d")['Close'], market.dividends(ticker, years))
+    if bands is None: return None, None
+    summary = {k: bands[k] for k in ('buy_yield', 'neutral_yield', 'sell_yield')}
+    return summary, weiss.chart_series(bands)
+
+
+def _analysis_ttl(record):
+    """Si el almacén no pudo refrescar los datos, el análisis no se cachea como fresco durante TTL."""
+    if record is not None and time.time() - record.as_of > get_market_data().ttl: return RETRY_TTL
+    return TTL
+
+
+@shared.memoize(ttl=_analysis_ttl, stale_ttl=STALE_TTL, version=records.VERSION)
+def get_full_analysis(ticker, years_hist=10):
+    try: return analysis.full_analysis(get_market_data(), ticker, years_hist, ratios=calculate_robust_ratios, growth=get_growth_estimate)
+    except UpstreamError: raise  # transitorio: no se cachea y se sigue sirviendo el último análisis bueno
+    except Exception: return None
@@ -0,0 +1,311 @@
+"""
+Almacén local persistente (SQLite) de precios, dividendos y estados financieros.
+
+Clave: (ticker, dataset). La primera vez se descarga el histórico completo; en
+cada refresco posterior solo se piden los días, trimestres y dividendos más
+recientes que lo ya guardado y se añaden al almacén.
+
+Todas las peticiones a Yahoo pasan por el planificador de upstream.py. Si un
+refresco falla pero ya hay datos guardados, se sirven los guardados (aunque estén
+caducados) y se reintenta en la siguiente lectura.
+"""
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import defaultdict
+from contextlib import closing, contextmanager
+from datetime import datetime
+
+import pandas as pd
+
+from valuation import metrics
+from valuation.upstream import Upstream, UpstreamError, scheduler
+
+DEFAULT_PATH = os.environ.get("VALOR_STORE_PATH", os.path.join(".cache", "market.sqlite"))
+DEFAULT_TTL = 3600
+MIN_SPAN_YEARS = 10  # la primera descarga cubre al menos esto: ratios (5-10 años) y Weiss comparten una sola
+
+# Días desde el último periodo guardado a partir de los cuales esperamos uno nuevo
+# (duración del periodo + retraso típico de publicación).
+STATEMENTS = {
+    'quarterly_financials': 135,
+    'financials': 455,
+    'quarterly_balance_sheet': 135,
+    'balance_sheet': 455,
+    'quarterly_cashflow': 135,
+    'cashflow': 455,
+}
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS prices (
+    ticker TEXT, date TEXT, close REAL,
+    PRIMARY KEY (ticker, date)) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS dividends (
+    ticker TEXT, date TEXT, amount REAL,
+    PRIMARY KEY (ticker, date)) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS statements (
+    ticker TEXT, dataset TEXT, period TEXT, item TEXT, value REAL,
+    PRIMARY KEY (ticker, dataset, period, item)) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS info (
+    ticker TEXT PRIMARY KEY, payload TEXT);
+CREATE TABLE IF NOT EXISTS meta (
+    ticker TEXT, dataset TEXT, fetched_at REAL, span_years INTEGER,
+    PRIMARY KEY (ticker, dataset)) WITHOUT ROWID;
+"""
+
+
+def _yf_ticker(ticker):
+    import yfinance as yf
+    return yf.Ticker(ticker)
+
+
+def _yf_download(tickers, **kwargs):
+    import yfinance as yf
+    return yf.download(tickers, interval="1d", auto_adjust=False, actions=True, group_by='ticker',
+                       threads=True, progress=False, **kwargs)
+
+
+def _naive_index(index):
+    idx = pd.DatetimeIndex(index)
+    if idx.tz is not None: idx = idx.tz_localize(None)
+    return idx.normalize()
+
+
+def _slice_ticker(data, ticker, n_tickers):
+    """Extrae un ticker del resultado de yf.download (columnas MultiIndex ticker/campo)."""
+    if isinstance(data.columns, pd.MultiIndex):
+        if ticker not in data.columns.get_level_values(0): return pd.DataFrame(columns=['Close'])
+        return data[ticker]
+    return data if n_tickers == 1 else pd.DataFrame(columns=['Close'])
+
+
+class MarketStore:
+    """
+    Almacén incremental de datos de mercado.
+    `ticker_factory` permite sustituir yfinance por un doble grabado (ver fixtures.py)
+    y `clock` fijar el "ahora" para reproducir fixtures de forma determinista.
+    `downloader` hace descargas en bloque (yf.download); sin él, `prefetch` va ticker a ticker.
+    `upstream` limita y reintenta las llamadas; con un doble inyectado, por defecto sin límite de tasa.
+    """
+
+    def __init__(self, path=DEFAULT_PATH, ticker_factory=None, ttl=DEFAULT_TTL, clock=time.time, downloader=None,
+                 upstream=None):
+        self.path = path
+        self.ttl = ttl
+        self.ticker_factory = ticker_factory or _yf_ticker
+        self.downloader = downloader or (_yf_download if ticker_factory is None else None)
+        self.upstream = upstream or (scheduler if ticker_factory is None else Upstream({}))
+        self.clock = clock
+        self._locks = defaultdict(threading.Lock)
+        self._locks_guard = threading.Lock()
+        self._memory_lock = threading.Lock()
+        if path != ":memory:" and os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self._memory_con = sqlite3.connect(path, check_same_thread=False) if path == ":memory:" else None
+        with self._db() as con: con.executescript(_SCHEMA)
+
+    # --- Infraestructura ---
+
+    @contextmanager
+    def _db(self):
+        if self._memory_con is not None:
+            with self._memory_lock, self._memory_con as con: yield con
+            return
+        with closing(sqlite3.connect(self.path, timeout=30)) as con:
+            con.execute("PRAGMA journal_mode=WAL")
+            with con: yield con
+
+    def _lock(self, ticker, dataset):
+        with self._locks_guard: return self._locks[(ticker, dataset)]
+
+    def _meta(self, con, ticker, dataset):
+        row = con.execute("SELECT fetched_at, span_years FROM meta WHERE ticker=? AND dataset=?", (ticker, dataset)).fetchone()
+        return {'fetched_at': row[0], 'span_years': row[1]} if row else None
+
+    def _set_meta(self, con, ticker, dataset, span_years=None):
+        con.execute("INSERT OR REPLACE INTO meta VALUES (?, ?, ?, ?)", (ticker, dataset, self.clock(), span_years))
+
+    def _is_fresh(self, meta):
+        return meta is not None and (self.clock() - meta['fetched_at']) < self.ttl
+
+    def _fetch(self, label, fn):
+        with metrics.timed(f"fetch.{label}"): return self.upstream.call("yahoo", fn)
+
+    def _today(self):
+        return pd.Timestamp(datetime.fromtimestamp(self.clock())).normalize()
+
+    # --- Precios y dividendos (una sola petición diaria alimenta ambos) ---
+
+    def _refresh_prices(self, ticker, years):
+        """
+        Descarga completa si no hay datos (o el rango pedido es mayor que el guardado);
+        en otro caso solo el delta desde la última sesión guardada.
+        Se usan cierres sin ajustar por dividendos para que el histórico no cambie
+        retroactivamente; un split en el delta fuerza la descarga completa.
+        """
+        with self._db() as con:
+            meta = self._meta(con, ticker, 'prices')
+            last = con.execute("SELECT MAX(date) FROM prices WHERE ticker=?", (ticker,)).fetchone()[0]
+        full = meta is None or last is None or (meta['span_years'] or 0) < years
+        span = max(years, MIN_SPAN_YEARS) if full else meta['span_years']
+
+        stock = self.ticker_factory(ticker)
+        fetch_full = lambda: self._fetch("history", lambda: stock.history(period=f"{span}y", interval="1d", auto_adjust=False, actions=True))
+        if full: hist = fetch_full()
+        else:
+            hist = self._fetch("history", lambda: stock.history(start=last, interval="1d", auto_adjust=False, actions=True))
+            if 'Stock Splits' in hist.columns and (hist['Stock Splits'].fillna(0) > 0).any():
+                hist, full = fetch_full(), True
+
+        with self._db() as con: self._write_prices(con, ticker, hist, span, full)
+
+    def _write_prices(self, con, ticker, hist, span, full):
+        if full:
+            con.execute("DELETE FROM prices WHERE ticker=?", (ticker,))
+            con.execute("DELETE FROM dividends WHERE ticker=?", (ticker,))
+        if not hist.empty:
+            dates = _naive_index(hist.index).strftime('%Y-%m-%d')
+            closes = hist['Close'].astype(float)
+            con.executemany("INSERT OR REPLACE INTO prices VALUES (?, ?, ?)",
+                            [(ticker, d, c) for d, c in zip(dates, closes.tolist()) if pd.notna(c)])
+            if 'Dividends' in hist.columns:
+                divs = hist['Dividends'].astype(float)
+                con.executemany("INSERT OR REPLACE INTO dividends VALUES (?, ?, ?)",
+                                [(ticker, d, v) for d, v in zip(dates, divs.tolist()) if pd.notna(v) and v > 0])
+        self._set_meta(con, ticker, 'prices', span)
+
+    def _ensure_prices(self, ticker, years):
+        with self._lock(ticker, 'prices'):
+            with self._db() as con: meta = self._meta(con, ticker, 'prices')
+            if not self._is_fresh(meta) or (meta['span_years'] or 0) < years:
+                try: self._refresh_prices(ticker, years)
+                except UpstreamError:
+                    if meta is None: raise  # sin nada guardado que servir
+
+    def prefetch(self, tickers, years=10):
+        """
+        Pone al día los precios de muchos tickers con dos descargas en bloque:
+        una completa para los que no tienen datos y otra delta para los caducados.
+        """
+        if self.downloader is None:
+            for t in tickers: self._ensure_prices(t, years)
+            return
+        pending = {}
+        with self._db() as con:
+            for t in dict.fromkeys(tickers):
+                meta = self._meta(con, t, 'prices')
+                if self._is_fresh(meta) and (meta['span_years'] or 0) >= years: continue
+                last = con.execute("SELECT MAX(date) FROM prices WHERE ticker=?", (t,)).fetchone()[0]
+                full = meta is None or last is None or (meta['span_years'] or 0) < years
+                pending[t] = (None, max(years, MIN_SPAN_YEARS)) if full else (last, meta['span_years'])
+
+        full = [t for t, (last, _) in pending.items() if last is None]
+        delta = [t for t, (last, _) in pending.items() if last is not None]
+        resplit = []
+        for group, kwargs in ((full, {'period': f"{max(years, MIN_SPAN_YEARS)}y"}),
+                              (delta, {'start': min((pending[t][0] for t in delta), default=None)})):
+            if not group: continue
+            try: data = self._fetch("download", lambda: self.downloader(group, **kwargs))
+            except UpstreamError: continue  # lo reintenta la lectura individual de cada ticker
+            with self._db() as con:
+                for t in group:
+                    hist = _slice_ticker(data, t, len(group)).dropna(subset=['Close'])
+                    if hist.empty and group is full: continue  # sin datos en bloque: lo reintenta la descarga individual
+                    if group is delta:
+                        hist = hist[_naive_index(hist.index) >= pd.Timestamp(pending[t][0])]
+                        if 'Stock Splits' in hist.columns and (hist['Stock Splits'].fillna(0) > 0).any():
+                            resplit.append(t)
+                            continue
+                    self._write_prices(con, t, hist, pending[t][1], group is full)
+        for t in resplit: self._refresh_prices(t, years)
+
+    def history(self, ticker, years=10, interval="1mo"):
+        """Cierres diarios ('1d') o mensuales ('1mo', inicio de mes como Yahoo) de los últimos `years` años."""
+        self._ensure_prices(ticker, years)
+        start = (self._today() - pd.DateOffset(years=years)).strftime('%Y-%m-%d')
+        with self._db() as con:
+            rows = con.execute("SELECT date, close FROM prices WHERE ticker=? AND date>=? ORDER BY date", (ticker, start)).fetchall()
+        hist = pd.DataFrame(rows, columns=['Date', 'Close'])
+        hist.index = pd.DatetimeIndex(pd.to_datetime(hist.pop('Date')), name='Date')
+        if interval == "1mo" and not hist.empty:
+            hist = hist.resample('MS').last().dropna()
+        return hist
+
+    def dividends(self, ticker, years=10):
+        """Dividendos pagados (fecha ex-dividendo) dentro del rango de precios guardado."""
+        self._ensure_prices(ticker, years)
+        with self._db() as con:
+            rows = con.execute("SELECT date, amount FROM dividends WHERE ticker=? ORDER BY date", (ticker,)).fetchall()
+        if not rows: return pd.Series(dtype=float, index=pd.DatetimeIndex([], name='Date'), name='Dividends')
+        dates, amounts = zip(*rows)
+        return pd.Series(amounts, index=pd.DatetimeIndex(pd.to_datetime(list(dates)), name='Date'), name='Dividends', dtype=float)
+
+    # --- Estados financieros ---
+
+    def statement(self, ticker, name):
+        """
+        Estado financiero con la orientación de yfinance (partidas x periodos).
+        Solo se vuelve a pedir cuando, por calendario, debería existir un periodo nuevo;
+        los periodos descargados se fusionan con los guardados, que se conservan.
+        """
+        if name not in STATEMENTS: raise ValueError(f"Dataset desconocido: {name}")
+        with self._lock(ticker, name):
+            with self._db() as con:
+                meta = self._meta(con, ticker, name)
+                last = con.execute("SELECT MAX(period) FROM statements WHERE ticker=? AND dataset=?", (ticker, name)).fetchone()[0]
+            if not self._is_fresh(meta):
+                due = last is None or (self._today() - pd.Timestamp(last)).days >= STATEMENTS[name]
+                try: df = self._fetch(name, lambda: getattr(self.ticker_factory(ticker), name)) if due else None
+                except UpstreamError:
+                    if meta is None: raise
+                    df = False  # se sirven los periodos guardados; meta sin tocar para reintentar en la próxima lectura
+                if df is not False:
+                    with self._db() as con:
+                        if df is not None and not df.empty:
+                            periods = _naive_index(df.columns).strftime('%Y-%m-%d')
+                            rows = [(ticker, name, p, str(item), float(v))
+                                    for item, values in df.iterrows()
+                                    for p, v in zip(periods, values.values) if pd.notna(v)]
+                            con.executemany("INSERT OR REPLACE INTO statements VALUES (?, ?, ?, ?, ?)", rows)
+                        self._set_meta(con, ticker, name)
+
+        with self._db() as con:
+            rows = con.execute("SELECT period, item, value FROM statements WHERE ticker=? AND dataset=?", (ticker, name)).fetchall()
+        if not rows: return pd.DataFrame()
+        long = pd.DataFrame(rows, columns=['period', 'item', 'value'])
+        long['period'] = pd.to_datetime(long['period'])
+        wide = long.pivot(index='item', columns='period', values='value')
+        wide.index.name, wide.columns.name = None, None
+        return wide[wide.columns.sort_values(ascending=False)]
+
+    # --- Info (instantánea, se reemplaza entera al expirar) ---
+
+    def info(self, ticker):
+        with self._lock(ticker, 'info'):
+            with self._db() as con: meta = self._meta(con, ticker, 'info')
+            if not self._is_fresh(meta):
+                try: payload = json.dumps(self._fetch("info", lambda: self.ticker_factory(ticker).info) or {}, default=str)
+                except UpstreamError:
+                    if meta is None: raise
+                    payload = None  # se sirve la última instantánea guardada
+                if payload is not None:
+                    with self._db() as con:
+                        con.execute("INSERT OR REPLACE INTO info VALUES (?, ?)", (ticker, payload))
+                        self._set_meta(con, ticker, 'info')
+                    return json.loads(payload)
+        with self._db() as con:
+            row = con.execute("SELECT payload FROM info WHERE ticker=?", (ticker,)).fetchone()
+        return json.loads(row[0]) if row else {}
+
+    def fetched_at(self, ticker, dataset):
+        """Momento (epoch) de la última descarga correcta de un dataset, o None si nunca se descargó."""
+        with self._db() as con: meta = self._meta(con, ticker, dataset)
+        return meta['fetched_at'] if meta else None
+
+    def refresh(self, ticker, years=10):
+        """Pone al día todos los datasets de un ticker (p. ej. para precalentar)."""
+        self.info(ticker)
+        self._ensure_prices(ticker, years)
+        for name in STATEMENTS: self.statement(ticker, name)
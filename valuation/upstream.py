@@ -0,0 +1,191 @@
+"""
+Planificador central del tráfico externo (Yahoo, Finviz, StockAnalysis).
+
+Cada llamada pasa por tres controles del host al que va dirigida:
+    - un token bucket que limita la tasa de peticiones (con ráfaga);
+    - reintentos con backoff exponencial y jitter completo;
+    - un circuit breaker: tras varios fallos seguidos el host se da por caído durante
+      un tiempo y las llamadas fallan al instante con CircuitOpenError.
+Solo los fallos transitorios (red, timeouts, HTTP 429/5xx, límite de tasa de Yahoo) se
+reintentan y cuentan para el circuit breaker, y se propagan como UpstreamError para que las
+capas superiores puedan servir el último dato bueno. Los demás (ticker inexistente, error
+de parseo) se relanzan tal cual al primer intento: un ticker mal escrito no abre el
+circuito del host para todos.
+"""
+import importlib
+import os
+import random
+import threading
+import time
+from functools import lru_cache
+
+from valuation import metrics
+
+
+def _limit(env, default):
+    """(tasa, ráfaga) desde una variable "tasa[,ráfaga]", p. ej. VALOR_YAHOO_RATE=5,10."""
+    value = os.environ.get(env)
+    if not value: return default
+    rate, _, burst = value.partition(",")
+    return float(rate), int(burst) if burst else default[1]
+
+
+# host -> (peticiones por segundo, ráfaga). Los hosts no listados no se limitan.
+# Yahoo no tiene endpoint en bloque para info y estados: el screener hace varias peticiones por
+# ticker sin datos frescos, así que un universo frío de 500 tickers tarda >= 500/tasa segundos.
+LIMITS = {
+    'yahoo': _limit("VALOR_YAHOO_RATE", (2.0, 5)),
+    'finviz.com': (1.0, 3),
+    'stockanalysis.com': (1.0, 3),
+}
+RETRIES = 3
+BASE_DELAY = 0.5    # s, primer backoff (se dobla en cada reintento)
+MAX_DELAY = 8.0
+FAILURE_THRESHOLD = 5
+COOLDOWN = 30.0     # s con el circuito abierto antes de dejar pasar una prueba
+
+
+class UpstreamError(Exception):
+    """Una fuente externa no respondió tras agotar los reintentos."""
+
+
+class CircuitOpenError(UpstreamError):
+    """El host acumula fallos recientes: no se le llama hasta que pase el enfriamiento."""
+
+
+@lru_cache(maxsize=None)
+def _transient_types():
+    # Importación perezosa: yfinance solo se carga si ya se está usando.
+    found = [ConnectionError, TimeoutError]
+    for module, names in (("requests.exceptions", ("ConnectionError", "Timeout")),
+                          ("curl_cffi.requests.exceptions", ("ConnectionError", "Timeout")),
+                          ("yfinance.exceptions", ("YFRateLimitError",))):
+        try: mod = importlib.import_module(module)
+        except ImportError: continue
+        found += [getattr(mod, n) for n in names if hasattr(mod, n)]
+    return tuple(found)
+
+
+def is_transient(exc):
+    """Fallos que merece la pena reintentar: red, timeouts, HTTP 429/5xx y el límite de tasa de Yahoo."""
+    status = getattr(getattr(exc, 'response', None), 'status_code', None)
+    if status is not None: return status == 429 or status >= 500
+    return isinstance(exc, _transient_types())
+
+
+class TokenBucket:
+
+    def __init__(self, rate, burst, clock=time.monotonic, sleep=time.sleep):
+        self.rate, self.burst, self.clock, self.sleep = rate, burst, clock, sleep
+        self._tokens, self._stamp = float(burst), clock()
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        """Reserva un token y espera lo necesario; las esperas se encolan en orden de llegada."""
+        with self._lock:
+            now = self.clock()
+            self._tokens = min(self.burst, self._tokens + (now - self._stamp) * self.rate)
+            self._stamp = now
+            self._tokens -= 1
+            wait = -self._tokens / self.rate if self._tokens < 0 else 0.0
+        if wait: self.sleep(wait)
+        return wait
+
+
+class CircuitBreaker:
+    """Cerrado -> abierto tras `threshold` fallos seguidos -> semiabierto (una prueba) tras `cooldown`."""
+
+    def __init__(self, threshold=FAILURE_THRESHOLD, cooldown=COOLDOWN, clock=time.monotonic):
+        self.threshold, self.cooldown, self.clock = threshold, cooldown, clock
+        self.failures, self.opened_at, self._probing = 0, None, False
+        self._lock = threading.Lock()
+
+    @property
+    def state(self):
+        if self.opened_at is None: return 'closed'
+        return 'half-open' if self.clock() - self.opened_at >= self.cooldown else 'open'
+
+    def allow(self):
+        with self._lock:
+            if self.opened_at is None: return True
+            if self.clock() - self.opened_at < self.cooldown or self._probing: return False
+            self._probing = True
+            return True
+
+    def cancel(self):
+        """La prueba terminó sin veredicto (error no transitorio): deja pasar otra."""
+        with self._lock: self._probing = False
+
+    def record(self, ok):
+        with self._lock:
+            if ok:
+                self.failures, self.opened_at, self._probing = 0, None, False
+                return
+            self.failures += 1
+            if self._probing or self.failures >= self.threshold:
+                self.opened_at, self._probing = self.clock(), False
+
+
+class Upstream:
+    """
+    `limits` {host: (tasa, ráfaga)}; `sleep` y `clock` inyectables para pruebas deterministas.
+    Una instancia sin límites (Upstream({})) conserva reintentos y circuit breaker.
+    """
+
+    def __init__(self, limits=None, retries=RETRIES, base_delay=BASE_DELAY, max_delay=MAX_DELAY,
+                 threshold=FAILURE_THRESHOLD, cooldown=COOLDOWN, clock=time.monotonic, sleep=time.sleep, seed=None):
+        self.limits = LIMITS if limits is None else limits
+        self.retries, self.base_delay, self.max_delay = retries, base_delay, max_delay
+        self.threshold, self.cooldown, self.clock, self.sleep = threshold, cooldown, clock, sleep
+        self._rng = random.Random(seed)
+        self._buckets, self._breakers = {}, {}
+        self._lock = threading.Lock()
+
+    def bucket(self, host):
+        with self._lock:
+            if host not in self._buckets:
+                rate_burst = self.limits.get(host)
+                self._buckets[host] = TokenBucket(*rate_burst, clock=self.clock, sleep=self.sleep) if rate_burst else None
+            return self._buckets[host]
+
+    def breaker(self, host):
+        with self._lock:
+            if host not in self._breakers:
+                self._breakers[host] = CircuitBreaker(self.threshold, self.cooldown, self.clock)
+            return self._breakers[host]
+
+    def backoff(self, attempt):
+        """Jitter completo: uniforme entre 0 y base·2^intento (acotado)."""
+        return self._rng.uniform(0, min(self.max_delay, self.base_delay * 2 ** attempt))
+
+    def call(self, host, fn, retries=None):
+        """Ejecuta `fn()` contra `host`; reintenta solo los fallos transitorios (is_transient)."""
+        retries = self.retries if retries is None else retries
+        breaker, bucket = self.breaker(host), self.bucket(host)
+        for attempt in range(retries + 1):
+            if not breaker.allow(): raise CircuitOpenError(f"{host}: demasiados fallos recientes")
+            if bucket:
+                waited = bucket.acquire()
+                if waited: metrics.observe(f"upstream.{host}.throttle", waited)
+            try:
+                result = fn()
+            except Exception as e:
+                if not is_transient(e):
+                    breaker.cancel()
+                    raise
+                breaker.record(False)
+                if attempt == retries: raise UpstreamError(f"{host}: {e}") from e
+                delay = self.backoff(attempt)
+                metrics.observe(f"upstream.{host}.backoff", delay)
+                self.sleep(delay)
+            else:
+                breaker.record(True)
+                return result
+
+    def status(self):
+        """{host: estado del circuito} de los hosts ya usados."""
+        with self._lock: breakers = dict(self._breakers)
+        return {host: b.state for host, b in sorted(breakers.items())}
+
+
+scheduler = Upstream()
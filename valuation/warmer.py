@@ -0,0 +1,184 @@
+"""
+Precalentamiento de la caché compartida para una lista de seguimiento (watchlist).
+
+Para cada ticker se calculan, con un presupuesto de concurrencia, el crecimiento, los
+ratios, el análisis completo, los datos Weiss y la historia de percentiles de los ratios, de modo que el primer usuario del día
+no pague la descarga en frío. Una entrada se recalcula si caduca antes de la próxima
+pasada, así que nunca llega a estar caducada cuando alguien la pide.
+
+Dos formas de ejecutarlo:
+    - dentro de la app: hilo de fondo si hay watchlist configurada (VALOR_WARMER=off lo desactiva);
+    - como comando aparte (cron, systemd, otro contenedor):
+        python -m valuation.warmer --once
+        python -m valuation.warmer --at 09:00 --every 30
+
+Configuración: VALOR_WATCHLIST="AAPL,MSFT" o VALOR_WATCHLIST_FILE=watchlist.txt (o .csv con
+columna 'ticker'); VALOR_WARM_AT, VALOR_WARM_EVERY (min), VALOR_WARM_UNTIL, VALOR_WARM_TZ,
+VALOR_WARM_WORKERS.
+"""
+import argparse
+import os
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+
+from valuation import metrics
+
+AT = os.environ.get("VALOR_WARM_AT", "09:00")           # antes de la apertura (09:30 en Nueva York)
+EVERY = int(os.environ.get("VALOR_WARM_EVERY", "30"))   # minutos entre pasadas durante la sesión
+UNTIL = os.environ.get("VALOR_WARM_UNTIL", "16:30")
+TZ = os.environ.get("VALOR_WARM_TZ", "America/New_York")
+WORKERS = int(os.environ.get("VALOR_WARM_WORKERS", "4"))
+YEARS = 10  # valor por defecto de la app (media histórica y Weiss)
+
+
+def load_watchlist(text=None, path=None):
+    """Tickers de VALOR_WATCHLIST / VALOR_WATCHLIST_FILE (o de los argumentos), sin duplicados."""
+    from valuation import screener
+    text = os.environ.get("VALOR_WATCHLIST", "") if text is None else text
+    path = os.environ.get("VALOR_WATCHLIST_FILE") if path is None else path
+    tickers = screener.parse_tickers(text)
+    if path and os.path.exists(path):
+        if path.lower().endswith(".csv"):
+            import pandas as pd
+            tickers += screener.tickers_from_csv(pd.read_csv(path))[0]
+        else:
+            with open(path) as f: tickers += screener.parse_tickers(f.read())
+    return list(dict.fromkeys(tickers))
+
+
+def _tz(name):
+    try:
+        from zoneinfo import ZoneInfo
+        return ZoneInfo(name)
+    except Exception:
+        return None  # sin base de datos de zonas: hora local
+
+
+class Schedule:
+    """
+    Días laborables: una pasada a `at` y después cada `every` minutos hasta `until`
+    (hora de `tz`). `every=0` deja solo la pasada previa a la apertura.
+    """
+
+    def __init__(self, at=AT, every=EVERY, until=UNTIL, tz=TZ):
+        self.at, self.until = _hhmm(at), _hhmm(until)
+        self.every = timedelta(minutes=every) if every else None
+        self.tz = _tz(tz)
+
+    def next_run(self, now=None):
+        now = now or datetime.now(self.tz)
+        for offset in range(8):
+            day = (now + timedelta(days=offset)).date()
+            if day.weekday() >= 5: continue
+            start = datetime.combine(day, self.at, tzinfo=now.tzinfo)
+            end = datetime.combine(day, self.until, tzinfo=now.tzinfo)
+            if now < start: return start
+            if self.every and now < end:
+                run = start + self.every * (-(-(now - start) // self.every))  # siguiente múltiplo
+                if run <= end: return run
+        raise RuntimeError("Sin próxima ejecución")  # no ocurre: siempre hay un día laborable en 8
+
+    def seconds_until_next(self, now=None):
+        now = now or datetime.now(self.tz)
+        return max((self.next_run(now) - now).total_seconds(), 0.0)
+
+
+def _hhmm(text):
+    return datetime.strptime(text, "%H:%M").time()
+
+
+class Warmer:
+    """
+    `tasks`: lista de (función memoizada, kwargs) que se precalientan por ticker, en orden.
+    Por defecto, las funciones de valuation.service que usa la página de un ticker.
+    `within`: margen (s) de recálculo; por defecto el intervalo entre pasadas.
+    `on_run(errores)` se llama al terminar cada pasada.
+    """
+
+    def __init__(self, tickers, tasks=None, max_workers=WORKERS, within=None, schedule=None, on_run=None):
+        self.tickers = list(tickers)
+        self.schedule = schedule or Schedule()
+        self.max_workers = max(max_workers, 1)
+        self.within = within if within is not None else (self.schedule.every or timedelta(hours=1)).total_seconds()
+        self.tasks = tasks if tasks is not None else default_tasks()
+        self.on_run = on_run
+        self.last_run = None
+        self._stop = threading.Event()
+        self._thread = None
+
+    def warm_ticker(self, ticker):
+        """Lista de errores (vacía si todo fue bien). Un fallo no impide las demás tareas."""
+        errors = []
+        with metrics.timed("warm.ticker"):
+            for fn, kwargs in self.tasks:
+                try: fn.warm(ticker, within=self.within, **kwargs)
+                except Exception as e: errors.append(f"{fn.__name__}: {e}")
+        return errors
+
+    def run_once(self):
+        """Una pasada sobre toda la watchlist. Devuelve {ticker: [errores]} de los que fallaron."""
+        with metrics.timed("warm.run"), ThreadPoolExecutor(self.max_workers, thread_name_prefix="warm") as pool:
+            errors = dict(zip(self.tickers, pool.map(self.warm_ticker, self.tickers)))
+        self.last_run = time.time()
+        errors = {t: e for t, e in errors.items() if e}
+        if self.on_run: self.on_run(errors)
+        return errors
+
+    def run_forever(self, immediately=True):
+        if immediately: self.run_once()
+        while not self._stop.wait(self.schedule.seconds_until_next()):
+            self.run_once()
+
+    def start(self, immediately=True):
+        """Hilo de fondo (daemon) con la planificación."""
+        self._thread = threading.Thread(target=self.run_forever, args=(immediately,), daemon=True, name="warmer")
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+
+
+def default_tasks(years=YEARS):
+    from valuation import ratios, service
+    return [(service.get_growth_estimate, {}), (service.calculate_robust_ratios, {'years': years}),
+            (service.get_full_analysis, {'years_hist': years}), (service.get_weiss_data, {'years': years}),
+            # Las dos vistas del selector de la app: historia completa y ventana móvil.
+            (service.get_ratio_history, {'years': years}),
+            (service.get_ratio_history, {'years': years, 'window': ratios.ROLLING_WINDOW})]
+
+
+def main(argv=None):
+    p = argparse.ArgumentParser(prog="python -m valuation.warmer", description="Precalienta la caché compartida para una watchlist.")
+    p.add_argument("tickers", nargs="*", help="Tickers (además de VALOR_WATCHLIST / --file)")
+    p.add_argument("--file", help="Fichero de watchlist (texto o CSV con columna 'ticker')")
+    p.add_argument("--once", action="store_true", help="Una sola pasada y salir (para cron)")
+    p.add_argument("--at", default=AT, help="Hora de la pasada previa a la apertura (HH:MM)")
+    p.add_argument("--every", type=int, default=EVERY, help="Minutos entre pasadas durante la sesión (0 = solo una)")
+    p.add_argument("--until", default=UNTIL, help="Última pasada del día (HH:MM)")
+    p.add_argument("--tz", default=TZ)
+    p.add_argument("--workers", type=int, default=WORKERS, help="Tickers en paralelo")
+    args = p.parse_args(argv)
+
+    tickers = list(dict.fromkeys([t.upper() for t in args.tickers] + load_watchlist(path=args.file)))
+    if not tickers: p.error("watchlist vacía: indica tickers, --file o VALOR_WATCHLIST")
+
+    def report(errors):
+        print(f"{datetime.now():%Y-%m-%d %H:%M:%S} {len(tickers) - len(errors)}/{len(tickers)} tickers calientes", flush=True)
+        for t, errs in errors.items():
+            for e in errs: print(f"  {t}: {e}", file=sys.stderr, flush=True)
+
+    warmer = Warmer(tickers, max_workers=args.workers, schedule=Schedule(args.at, args.every, args.until, args.tz), on_run=report)
+    if args.once:
+        errors = warmer.run_once()  # fallo solo si ningún ticker calentó ninguna tarea
+        return 1 if len(errors) == len(tickers) and all(len(e) == len(warmer.tasks) for e in errors.values()) else 0
+    try: warmer.run_forever()
+    except KeyboardInterrupt: pass
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,95 @@
+"""
+Canal de valoración Geraldine Weiss (Investment Yield Theory).
+
+El dividendo TTM se calcula directamente sobre los eventos de dividendo (dispersos)
+con sumas acumuladas y búsqueda binaria: sin calendario diario intermedio. Las bandas
+se devuelven como arrays compactos, y para pintar se reducen a resolución de pantalla
+con LTTB (Largest-Triangle-Three-Buckets), que conserva la forma de la serie.
+"""
+import numpy as np
+import pandas as pd
+
+from valuation import metrics
+
+WINDOW_DAYS = 365
+YIELD_BOUNDS = (0.1, 20)  # % válidos para el rango histórico
+SCREEN_POINTS = 1000
+
+
+def ttm_dividends(div_dates, div_amounts, dates, window_days=WINDOW_DAYS, record_start=None):
+    """
+    Suma de dividendos en la ventana (t - window, t] para cada fecha de `dates`.
+    NaN donde la ventana empieza antes de `record_start` (por defecto la primera fecha),
+    porque ahí el histórico de dividendos no cubre el año completo.
+    """
+    div_dates = np.asarray(div_dates, dtype='datetime64[ns]')
+    dates = np.asarray(dates, dtype='datetime64[ns]')
+    order = np.argsort(div_dates)
+    csum = np.concatenate(([0.0], np.cumsum(np.asarray(div_amounts, dtype=float)[order])))
+    div_dates = div_dates[order]
+    window = np.timedelta64(window_days, 'D')
+    hi = np.searchsorted(div_dates, dates, side='right')
+    lo = np.searchsorted(div_dates, dates - window, side='right')
+    ttm = csum[hi] - csum[lo]
+    start = dates[0] if record_start is None else np.datetime64(record_start, 'ns')
+    return np.where(dates - window + np.timedelta64(1, 'D') >= start, ttm, np.nan)
+
+
+@metrics.timer("weiss.bands")
+def weiss_bands(close, dividends, window_days=WINDOW_DAYS):
+    """
+    `close`: Serie de cierres (índice fecha); `dividends`: Serie de eventos de dividendo.
+    Devuelve dict de arrays (dates, close, ttm, yield, undervalued, overvalued) y las
+    rentabilidades de referencia (buy/neutral/sell, en %), o None si no hay datos suficientes.
+    """
+    close = close.dropna()
+    if close.empty or dividends.empty: return None
+    dates = close.index.values
+    px = close.to_numpy(float)
+    ttm = ttm_dividends(dividends.index.values, dividends.to_numpy(float), dates, window_days)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        yld = ttm / px * 100
+    valid = yld[(yld > YIELD_BOUNDS[0]) & (yld < YIELD_BOUNDS[1])]
+    if valid.size == 0: return None
+    min_y, med_y, max_y = np.quantile(valid, [0.05, 0.5, 0.95])
+    return {
+        'dates': dates, 'close': px, 'ttm': ttm, 'yield': yld,
+        'undervalued': ttm / max_y * 100, 'overvalued': ttm / min_y * 100,
+        'buy_yield': float(max_y), 'neutral_yield': float(med_y), 'sell_yield': float(min_y),
+    }
+
+
+def lttb_indices(x, y, n_out):
+    """Índices elegidos por LTTB (x numérico creciente, y finito)."""
+    n = len(x)
+    if n_out >= n or n_out < 3: return np.arange(n)
+    edges = np.linspace(1, n - 1, n_out - 1).astype(int)
+    # Medias de cada cubo (el "siguiente" del último es el punto final), calculadas de una vez.
+    counts = np.diff(np.append(edges, n))
+    avg_x = np.add.reduceat(x, edges) / counts
+    avg_y = np.add.reduceat(y, edges) / counts
+    idx = np.empty(n_out, dtype=int)
+    idx[0], idx[-1] = 0, n - 1
+    a = 0
+    for i in range(n_out - 2):
+        start, end = edges[i], edges[i + 1]
+        xs, ys = x[start:end], y[start:end]
+        area = np.abs((x[a] - avg_x[i + 1]) * (ys - y[a]) - (x[a] - xs) * (avg_y[i + 1] - y[a]))
+        a = start + int(area.argmax())
+        idx[i + 1] = a
+    return idx
+
+
+def downsample(dates, values, n_out=SCREEN_POINTS):
+    """(fechas, valores) reducidos a `n_out` puntos con LTTB, ignorando NaN."""
+    dates, values = np.asarray(dates), np.asarray(values, dtype=float)
+    mask = np.isfinite(values)
+    dates, values = dates[mask], values[mask]
+    idx = lttb_indices(dates.astype('datetime64[ns]').astype(np.int64).astype(float), values, n_out)
+    return pd.DatetimeIndex(dates[idx]), values[idx]
+
+
+@metrics.timer("weiss.downsample")
+def chart_series(bands, n_out=SCREEN_POINTS):
+    """Series listas para pintar: precio y bandas reducidas a resolución de pantalla."""
+    return {k: downsample(bands['dates'], bands[k], n_out) for k in ('close', 'undervalued', 'overvalued')}